@@ -0,0 +1,139 @@
+# pipeline.py
+'''
+Fused processing pipelines.
+
+A chain of generator expressions pays for a generator resume at every
+stage for every item. A Pipeline is declared as a sequence of stages
+and compiled into a single loop instead:
+
+    p = (Pipeline()
+         .transform(csv.reader)
+         .map(Ticker.from_row)
+         .filter('v.change < 0')
+         .sink(print))
+    p.run(follow('Data/stocklog.csv'))
+
+map() and filter() stages are pure and are fused into one loop body.
+A stage is either a callable or an expression string in terms of v,
+which is inlined into the generated code. transform() stages take an
+iterable and return an iterable (csv.reader, for example), so the
+stages on either side of one are compiled as separate loops.
+'''
+
+class Pipeline:
+    def __init__(self):
+        self._stages = []          # (kind, name, func or expression)
+        self._sink = None
+        self._compiled = None
+        self._counts = []
+
+    def _add(self, kind, func, name):
+        if self._sink is not None:
+            raise TypeError('Pipeline already has a sink')
+        if name is None:
+            name = func if isinstance(func, str) else getattr(func, '__qualname__', repr(func))
+        self._stages.append((kind, name, func))
+        self._compiled = None
+        return self
+
+    def map(self, func, name=None):
+        return self._add('map', func, name)
+
+    def filter(self, func, name=None):
+        return self._add('filter', func, name)
+
+    def transform(self, func, name=None):
+        return self._add('transform', func, name)
+
+    def sink(self, func, name=None):
+        self._add('sink', func, name)
+        self._sink = func
+        return self
+
+    def compile(self):
+        '''
+        Generate the code for the pipeline. Each run of map/filter stages
+        becomes one loop, counting items wherever the number of items can
+        change (on entry to the loop and after every filter).
+        '''
+        segments = [[]]
+        for n, stage in enumerate(self._stages):
+            if stage[0] == 'transform':
+                segments.append([])
+            segments[-1].append((n, stage))
+
+        locs = {}
+        code = ''
+        run = 'def _run(_items):\n'
+        self._points = [None] * len(self._stages)    # (in, out) count points
+        npoints = 0
+        point = None
+        for nseg, segment in enumerate(segments):
+            if not segment:
+                continue
+            if segment[0][1][0] == 'transform':
+                n, (kind, name, func) = segment.pop(0)
+                locs[f'_f{n}'] = func
+                run += f'    _items = _f{n}(_items)\n'
+                self._points[n] = (point, npoints)
+
+            code += f'def _seg{nseg}(_items):\n'
+            code += '    for v in _items:\n'
+            code += f'        _n[{npoints}] += 1\n'
+            point = npoints
+            npoints += 1
+            for n, (kind, name, func) in segment:
+                inpoint = point
+                if isinstance(func, str):
+                    expr = func
+                else:
+                    locs[f'_f{n}'] = func
+                    expr = f'_f{n}(v)'
+                if kind == 'map':
+                    code += f'        v = {expr}\n'
+                elif kind == 'filter':
+                    code += f'        if not ({expr}):\n'
+                    code += '            continue\n'
+                    code += f'        _n[{npoints}] += 1\n'
+                    point = npoints
+                    npoints += 1
+                else:
+                    code += f'        {expr}\n'
+                self._points[n] = (inpoint, point)
+            if segment and segment[-1][1][0] == 'sink':
+                run += f'    return _seg{nseg}(_items)\n'
+            else:
+                code += '        yield v\n'
+                run += f'    _items = _seg{nseg}(_items)\n'
+        if self._sink is None:
+            run += '    return _items\n'
+
+        self._counts = [0] * npoints
+        locs['_n'] = self._counts
+        self._code = code + run
+        exec(self._code, locs)
+        self._compiled = locs['_run']
+        return self._compiled
+
+    def run(self, items):
+        '''
+        Feed items through the pipeline. With a sink, runs until the
+        items are exhausted. Without one, returns an iterator over the
+        results.
+        '''
+        if self._compiled is None:
+            self.compile()
+        return self._compiled(items)
+
+    def stats(self):
+        '''
+        Return a list of (kind, name, items in, items out) for each stage.
+        The input count of a leading transform() is not known (None).
+        '''
+        if self._compiled is None:
+            self.compile()
+        return [(kind, name, *(None if p is None else self._counts[p] for p in points))
+                for (kind, name, func), points in zip(self._stages, self._points)]
+
+    def reset(self):
+        self._counts[:] = [0] * len(self._counts)
@@ -19,8 +19,20 @@ if __name__ == '__main__':
 
     formatter = create_formatter('text')
 
+    import sys
     lines = follow('../../Data/stocklog.csv')
-    rows = csv.reader(lines)
-    records = (Ticker.from_row(row) for row in rows)
-    negative = (rec for rec in records if rec.change < 0)
-    print_table(negative, ['name','price','change'], formatter)
+    if sys.argv[1:] == ['fused']:
+        from pipeline import Pipeline
+        formatter.headings(['name','price','change'])
+        pipeline = (Pipeline()
+                    .transform(csv.reader)
+                    .map(Ticker.from_row)
+                    .filter('v.change < 0')
+                    .map('[v.name, v.price, v.change]')
+                    .sink(formatter.row))
+        pipeline.run(lines)
+    else:
+        rows = csv.reader(lines)
+        records = (Ticker.from_row(row) for row in rows)
+        negative = (rec for rec in records if rec.change < 0)
+        print_table(negative, ['name','price','change'], formatter)
@@ -1,17 +1,36 @@
 # multitask.py
 
 from collections import deque
+from heapq import heappush, heappop
+from itertools import count
+import time
 
 tasks = deque()
+sleeping = []    #  heap of (deadline, sequence, task)
+sequence = count()
+
 def run():
-    while tasks:
+    while tasks or sleeping:
+        if sleeping:
+            if not tasks:
+                # Nothing else to run. Wait for the nearest deadline
+                time.sleep(max(sleeping[0][0] - time.monotonic(), 0))
+            now = time.monotonic()
+            while sleeping and sleeping[0][0] <= now:
+                tasks.append(heappop(sleeping)[2])
         task = tasks.popleft()
         try:
-            next(task)
-            tasks.append(task)
+            trap = next(task)
+            if isinstance(trap, tuple) and trap[:1] == ('sleep',):
+                heappush(sleeping, (time.monotonic() + trap[1], next(sequence), task))
+            else:
+                tasks.append(task)
         except StopIteration:
             print('Task done')
 
+def sleep(seconds):
+    yield 'sleep', seconds
+
 def countdown(n):
     while n > 0:
         print('T-minus', n)
@@ -25,9 +44,16 @@ def countup(n):
         yield
         x += 1
 
+def periodic(name, interval, n):
+    for i in range(n):
+        print(name, 'tick', i)
+        yield from sleep(interval)
+
 if __name__ == '__main__':
     tasks.append(countdown(10))
     tasks.append(countdown(5))
     tasks.append(countup(20))
+    tasks.append(periodic('fast', 0.1, 5))
+    tasks.append(periodic('slow', 0.25, 3))
     run()
 
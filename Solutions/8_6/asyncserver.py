@@ -1,43 +1,168 @@
 # server.py
 
 from socket import *
-from select import select
-from collections import deque
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from collections import deque, Counter
+from heapq import heappush, heappop
+from itertools import count
+import time
+from concurrent.futures import ThreadPoolExecutor
 from types import coroutine
+from queue import Empty
+import multiprocessing
+import os
 
 tasks = deque()
 recv_wait = {}   #  sock -> task
 send_wait = {}   #  sock -> task
+sleeping = []    #  heap of (deadline, sequence, task)
+sequence = count()
+parked = set()   #  tasks waiting on an executor future
+completed = deque()   #  parked tasks whose future is done (from other threads)
+stats = Counter()
+
+# Sockets stay registered with the selector (epoll on Linux) between
+# waits. Only sockets whose waiting tasks changed since the last select
+# are re-registered, so a task that waits on the same socket again
+# costs no system call.
+selector = DefaultSelector()
+registered = {}  #  sock -> (fd, events)
+changed = set()
+
+def update_registrations():
+    # Unregister first, in case a closed socket's descriptor was reused
+    for sock in sorted(changed, key=lambda s: s in recv_wait or s in send_wait):
+        events = ((EVENT_READ if sock in recv_wait else 0) |
+                  (EVENT_WRITE if sock in send_wait else 0))
+        fd, current = registered.get(sock, (None, 0))
+        if events == current:
+            continue
+        if not events:
+            del registered[sock]
+            selector.unregister(fd)
+            continue
+        if current:
+            selector.modify(fd, events)
+        else:
+            fd = selector.register(sock, events).fd
+        registered[sock] = (fd, events)
+    changed.clear()
+
+# Blocking work is handed to an executor. A done callback, run in the
+# executor's thread, queues the task on completed and writes a byte to a
+# self-pipe registered with the selector, which wakes up run().
+executor = None
+wakeup = None    #  (read fd, write fd)
+
+def wait_future(future, task):
+    global wakeup
+    if wakeup is None:
+        wakeup = os.pipe()
+        for fd in wakeup:
+            os.set_blocking(fd, False)
+        selector.register(wakeup[0], EVENT_READ, 'wakeup')
+    parked.add(task)
+    future.add_done_callback(lambda future: notify(task))
+
+def notify(task):
+    completed.append(task)
+    try:
+        os.write(wakeup[1], b'\0')
+    except BlockingIOError:
+        pass     # The pipe is full, so run() is being woken anyway
+
+def wake_completed():
+    while completed:
+        task = completed.popleft()
+        parked.discard(task)
+        tasks.append(task)
+
+def wake_sleepers():
+    now = time.monotonic()
+    while sleeping and sleeping[0][0] <= now:
+        tasks.append(heappop(sleeping)[2])
 
 def run():
-    while any([tasks, recv_wait, send_wait]):
+    while any([tasks, recv_wait, send_wait, sleeping, parked]):
+        if sleeping:
+            wake_sleepers()
+        if completed:
+            wake_completed()
         while not tasks:
-            can_recv, can_send, _ = select(recv_wait, send_wait, [])
-            for s in can_recv:
-                tasks.append(recv_wait.pop(s))
-            for s in can_send:
-                tasks.append(send_wait.pop(s))
+            update_registrations()
+            timeout = max(sleeping[0][0] - time.monotonic(), 0) if sleeping else None
+            for key, events in selector.select(timeout):
+                if key.data == 'wakeup':
+                    os.read(wakeup[0], 4096)
+                    wake_completed()
+                    continue
+                sock = key.fileobj
+                if events & EVENT_READ and sock in recv_wait:
+                    tasks.append(recv_wait.pop(sock))
+                if events & EVENT_WRITE and sock in send_wait:
+                    tasks.append(send_wait.pop(sock))
+                changed.add(sock)
+            if sleeping:
+                wake_sleepers()
         task = tasks.popleft()
         try:
             reason, resource = task.send(None)
             if reason == 'recv':
                 recv_wait[resource] = task
+                changed.add(resource)
             elif reason == 'send':
                 send_wait[resource] = task
+                changed.add(resource)
+            elif reason == 'sleep':
+                heappush(sleeping, (time.monotonic() + resource, next(sequence), task))
+            elif reason == 'future':
+                wait_future(resource, task)
             else:
                 raise RuntimeError('Unknown reason %r' % reason)
         except StopIteration:
             print('Task done')
 
+@coroutine
+def sleep(seconds):
+    yield 'sleep', seconds
+
+@coroutine
+def run_in_executor(func, *args, executor=None):
+    '''
+    Run func(*args) in an executor (a shared ThreadPoolExecutor unless
+    one is given, such as a ProcessPoolExecutor for CPU-bound work) and
+    return its result. Other tasks keep running in the meantime.
+    '''
+    if executor is None:
+        executor = get_executor()
+    future = executor.submit(func, *args)
+    yield 'future', future
+    return future.result()
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor()
+    return executor
+
 class GenSocket:
     def __init__(self, sock):
+        # Non-blocking, so that a send on a writable socket sends what
+        # fits and returns instead of stalling every task
+        sock.setblocking(False)
         self.sock = sock
 
     @coroutine
     def accept(self):
-        yield 'recv', self.sock
-        client, addr = self.sock.accept()
-        return GenSocket(client), addr
+        while True:
+            yield 'recv', self.sock
+            try:
+                client, addr = self.sock.accept()
+            except BlockingIOError:
+                # A shared, non-blocking listening socket. Another
+                # process took the connection.
+                continue
+            return GenSocket(client), addr
 
     @coroutine
     def recv(self, maxsize):
@@ -49,28 +174,183 @@ class GenSocket:
         yield 'send', self.sock
         return self.sock.send(data)
 
+    @coroutine
+    def recv_into(self, buffer, nbytes=0):
+        yield 'recv', self.sock
+        return self.sock.recv_into(buffer, nbytes)
+
+    @coroutine
+    def sendall(self, data):
+        '''
+        Send all of data, waiting as needed. A partial send continues
+        from a memoryview, so the data is never copied.
+        '''
+        yield 'send', self.sock
+        nsent = self.sock.send(data)
+        if nsent < len(data):
+            view = memoryview(data)[nsent:]
+            while view:
+                yield 'send', self.sock
+                view = view[self.sock.send(view):]
+
+    @coroutine
+    def sendmsg(self, buffers):
+        '''
+        Send all of a list of buffers (say, a header and a payload) with
+        vectored writes instead of joining them first
+        '''
+        while buffers:
+            yield 'send', self.sock
+            nsent = self.sock.sendmsg(buffers)
+            for n, buf in enumerate(buffers):
+                if nsent < len(buf):
+                    buffers = [memoryview(buf)[nsent:], *buffers[n+1:]]
+                    break
+                nsent -= len(buf)
+            else:
+                return
+
     def __getattr__(self, name):
         return getattr(self.sock, name)
 
-async def tcp_server(address, handler):
-    sock = GenSocket(socket(AF_INET, SOCK_STREAM))
+def listener(address, *, reuseport=False, backlog=5):
+    sock = socket(AF_INET, SOCK_STREAM)
     sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    if reuseport:
+        sock.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
     sock.bind(address)
-    sock.listen(5)
+    sock.listen(backlog)
+    return sock
+
+async def tcp_server(address, handler, *, sock=None):
+    sock = GenSocket(sock or listener(address))
     while True:
         client, addr = await sock.accept()
+        stats['connections'] += 1
         tasks.append(handler(client, addr))
         
 async def echo_handler(client, address):
     print('Connection from', address)
+    buffer = bytearray(1000)
+    view = memoryview(buffer)
     while True:
-        data = await client.recv(1000)
-        if not data:
+        nbytes = await client.recv_into(buffer)
+        if not nbytes:
             break
-        await client.send(b'GOT:' + data)
+        stats['messages'] += 1
+        await client.sendmsg([b'GOT:', view[:nbytes]])
     print('Connection closed')
 
-if __name__ == '__main__':
-    tasks.append(tcp_server(('',25000), echo_handler))
+# Sharded mode. A Supervisor starts N worker processes, each running
+# its own scheduler loop with a tcp_server on the same port. With
+# SO_REUSEPORT every worker has its own listening socket and the kernel
+# spreads connections over them. Otherwise the socket is created before
+# forking and shared (pre-fork). Workers send their stats to the
+# supervisor, which restarts any worker that dies.
+
+async def report_stats(n, queue, interval):
+    while True:
+        await sleep(interval)
+        queue.put((n, os.getpid(), dict(stats)))
+
+def worker(n, address, handler, sock, queue, interval):
+    # The selector's epoll instance (and any wakeup pipe or executor
+    # threads) would be shared with, or lost from, the parent
+    global selector, wakeup, executor
+    selector = DefaultSelector()
+    wakeup = executor = None
+    if sock is None:
+        sock = listener(address, reuseport=True, backlog=128)
+    tasks.append(tcp_server(address, handler, sock=sock))
+    tasks.append(report_stats(n, queue, interval))
     run()
 
+class Supervisor:
+    def __init__(self, address, handler, workers=None, *, reuseport=None, interval=1.0):
+        self.address = address
+        self.handler = handler
+        self.nworkers = workers or os.cpu_count()
+        if reuseport is None:
+            reuseport = 'SO_REUSEPORT' in globals()
+        self.sock = None
+        if not reuseport:
+            self.sock = listener(address, backlog=128)
+            self.sock.setblocking(False)
+        self.interval = interval
+        self.context = multiprocessing.get_context('fork')
+        self.queue = self.context.Queue()
+        self.workers = {}       # n -> Process
+        self.latest = {}        # n -> last stats reported by the current process
+        self.retired = Counter()
+
+    def start_worker(self, n):
+        proc = self.context.Process(target=worker, daemon=True,
+                                    args=(n, self.address, self.handler, self.sock,
+                                          self.queue, self.interval))
+        proc.start()
+        self.workers[n] = proc
+
+    def start(self):
+        for n in range(self.nworkers):
+            self.start_worker(n)
+
+    def poll(self, timeout):
+        '''
+        Collect stats reports for up to timeout seconds, then restart any
+        workers that have died
+        '''
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                n, pid, report = self.queue.get(timeout=remaining)
+            except Empty:
+                break
+            if self.workers[n].pid == pid:
+                self.latest[n] = report
+        for n, proc in list(self.workers.items()):
+            if not proc.is_alive():
+                print('Worker', n, 'exited with', proc.exitcode, '- restarting')
+                self.retired.update(self.latest.pop(n, {}))
+                self.retired['restarts'] += 1
+                self.start_worker(n)
+
+    def totals(self):
+        '''
+        Return the stats summed over all workers, past and present
+        '''
+        total = Counter(self.retired)
+        for report in self.latest.values():
+            total.update(report)
+        return total
+
+    def per_worker(self):
+        return {n: self.latest.get(n, {}) for n in self.workers}
+
+    def stop(self):
+        for proc in self.workers.values():
+            proc.terminate()
+        for proc in self.workers.values():
+            proc.join()
+
+    def run(self, report=None):
+        self.start()
+        try:
+            while True:
+                self.poll(self.interval)
+                if report:
+                    report(self)
+        finally:
+            self.stop()
+
+def serve(address, handler, workers=None, **kwargs):
+    Supervisor(address, handler, workers, **kwargs).run(
+        lambda sup: print('Stats:', dict(sup.totals())))
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1:
+        serve(('',25000), echo_handler, int(sys.argv[1]))
+    else:
+        tasks.append(tcp_server(('',25000), echo_handler))
+        run()
+
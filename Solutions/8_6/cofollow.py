@@ -1,17 +1,28 @@
 # cofollow.py
-import os
-import time
 import csv
+import time
+import follow as _follow
+
+# Sent by follow() when the file has been idle, so that stages holding
+# on to items (see batcher) can flush them
+FLUSH = object()
+
+def follow(filename,target, idle=None):
+    for lines in _follow.follow_blocks(filename, idle=idle):
+        if not lines:
+            target.send(FLUSH)
+        for line in lines:
+            target.send(line)
 
-def follow(filename,target):
-    with open(filename,"r") as f:
-        f.seek(0,os.SEEK_END)
-        while True:
-            line = f.readline()
-            if line != '':
-                target.send(line)
-            else:
-                time.sleep(0.1)
+def follow_batches(filename, target, size=1000):
+    '''
+    Send lists of lines to target. Each list holds the lines from one
+    read of the file (at most size of them), so a burst is delivered
+    together and a lone line is delivered immediately.
+    '''
+    for lines in _follow.follow_blocks(filename):
+        for n in range(0, len(lines), size):
+            target.send(lines[n:n+size])
 
 def receive(expected_type):
     msg = yield
@@ -29,6 +40,28 @@ def consumer(func):
         return f
     return start
 
+@consumer
+def batcher(target, size=100, interval=0.01):
+    '''
+    Collect single items into lists for target. A list is sent once it
+    holds size items, once interval seconds have passed since its first
+    item (checked as items arrive), or when FLUSH is received. Use with
+    follow(filename, batcher(...), idle=interval) so that a quiet file
+    still gets its last items flushed.
+    '''
+    while True:
+        item = yield
+        if item is FLUSH:
+            continue
+        batch = [item]
+        deadline = time.monotonic() + interval
+        while len(batch) < size and time.monotonic() < deadline:
+            item = yield
+            if item is FLUSH:
+                break
+            batch.append(item)
+        target.send(batch)
+
 # Sample coroutine
 @consumer
 def printer():
@@ -13,7 +13,7 @@ class Ticker(Structure):
     low = Float()
     volume = Integer()
 
-from cofollow import consumer, follow, receive
+from cofollow import consumer, follow, follow_batches, receive
 from tableformat import create_formatter
 import csv
 
@@ -50,9 +50,51 @@ def ticker(fmt, fields):
         row = [getattr(rec, name) for name in fields]
         formatter.row(row)
 
+# Batched versions of the stages above. Each receives a list of items
+# and sends a list on, so the send()/resume cost is paid per batch
+# instead of per line. Feed them with follow_batches() or batcher().
+
+@consumer
+def to_csv_batch(target):
+    while True:
+        lines = yield from receive(list)
+        target.send(list(csv.reader(lines)))
+
+@consumer
+def create_ticker_batch(target):
+    from_row = Ticker.from_row
+    while True:
+        rows = yield from receive(list)
+        target.send([from_row(row) for row in rows])
+
+@consumer
+def negchange_batch(target):
+    while True:
+        records = yield from receive(list)
+        records = [rec for rec in records if rec.change < 0]
+        if records:
+            target.send(records)
+
+@consumer
+def ticker_batch(fmt, fields):
+    formatter = create_formatter(fmt)
+    formatter.headings(fields)
+    while True:
+        records = yield from receive(list)
+        for rec in records:
+            formatter.row([getattr(rec, name) for name in fields])
+
 if __name__ == '__main__':
-    follow('../../Data/stocklog.csv',
-           to_csv(
-           create_ticker(
-           negchange(
-           ticker('text', ['name','price','change'])))))
+    import sys
+    if sys.argv[1:] == ['batch']:
+        follow_batches('../../Data/stocklog.csv',
+                       to_csv_batch(
+                       create_ticker_batch(
+                       negchange_batch(
+                       ticker_batch('text', ['name','price','change'])))))
+    else:
+        follow('../../Data/stocklog.csv',
+               to_csv(
+               create_ticker(
+               negchange(
+               ticker('text', ['name','price','change'])))))
@@ -0,0 +1,161 @@
+# follow.py
+#
+# Follow lines appended to a file. The file is read in large blocks and
+# split into lines here, keeping any partial trailing line until the
+# rest of it arrives. When there's no new data, the follower blocks on
+# inotify (Linux, via ctypes) or falls back to polling with an
+# adaptive backoff. Log rotation (a new file at the same path) and
+# truncation are detected and followed.
+
+import ctypes
+import ctypes.util
+import os
+import sys
+import time
+from select import select
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class InotifyWaiter:
+    '''
+    Block until a watched file changes using Linux inotify
+    '''
+    mask = IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.wd = None
+
+    def watch(self, filename):
+        if self.wd is not None:
+            self.libc.inotify_rm_watch(self.fd, self.wd)
+        self.wd = self.libc.inotify_add_watch(self.fd, os.fsencode(filename), self.mask)
+        if self.wd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed', filename)
+
+    def wait(self, timeout):
+        ready, _, _ = select([self.fd], [], [], timeout)
+        if ready:
+            # Drain the pending events. Only the wakeup matters.
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def reset(self):
+        pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollWaiter:
+    '''
+    Sleep between checks, doubling the delay while the file stays idle
+    '''
+
+    def __init__(self, min_delay=0.0005, max_delay=0.1):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min_delay
+
+    def watch(self, filename):
+        self.delay = self.min_delay
+
+    def wait(self, timeout):
+        time.sleep(min(self.delay, timeout))
+        self.delay = min(self.delay * 2, self.max_delay)
+
+    def reset(self):
+        self.delay = self.min_delay
+
+    def close(self):
+        pass
+
+
+def make_waiter():
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWaiter()
+        except (OSError, AttributeError):
+            pass
+    return PollWaiter()
+
+
+def follow(filename, **kwargs):
+    '''
+    Generator that produces a sequence of lines being written at the end of a file.
+    '''
+    for lines in follow_blocks(filename, **kwargs):
+        yield from lines
+
+
+def follow_blocks(filename, *, blocksize=1 << 16, check_interval=1.0, idle=None):
+    '''
+    Generator that produces a list of the complete lines found in each
+    block read from the end of a file. check_interval bounds how long
+    it waits before checking the path for rotation when no change has
+    been seen. If idle is given, an empty list is produced each time
+    idle seconds pass with no new data, so consumers can flush.
+    '''
+    waiter = make_waiter()
+    f = open(filename, 'rb')
+    try:
+        f.seek(0, os.SEEK_END)
+        waiter.watch(filename)
+        partial = b''
+        last = time.monotonic()
+        while True:
+            data = f.read(blocksize)
+            if data:
+                waiter.reset()
+                last = time.monotonic()
+                lines = (partial + data).split(b'\n')
+                partial = lines.pop()
+                if lines:
+                    yield [line.decode('utf-8') + '\n' for line in lines]
+                continue
+
+            # At the end of the file. Check for rotation and truncation.
+            try:
+                st = os.stat(filename)
+            except FileNotFoundError:
+                st = None
+            if st is not None and st.st_ino != os.fstat(f.fileno()).st_ino:
+                f.close()
+                f = open(filename, 'rb')
+                waiter.watch(filename)
+                partial = b''
+                continue
+            if st is not None and st.st_size < f.tell():
+                f.seek(0)
+                partial = b''
+                continue
+            if idle is None:
+                waiter.wait(check_interval)
+                continue
+            remaining = last + idle - time.monotonic()
+            if remaining <= 0:
+                yield []
+                last = time.monotonic()
+            else:
+                waiter.wait(min(check_interval, remaining))
+    finally:
+        f.close()
+        waiter.close()
+
+
+# Example use
+if __name__ == '__main__':
+    for line in follow('../../Data/stocklog.csv'):
+        print(line, end='')
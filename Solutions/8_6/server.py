@@ -1,35 +1,149 @@
 # server.py
 
 from socket import *
-from select import select
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
 from collections import deque
+from heapq import heappush, heappop
+from itertools import count
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 tasks = deque()
 recv_wait = {}   #  sock -> task
 send_wait = {}   #  sock -> task
+sleeping = []    #  heap of (deadline, sequence, task)
+sequence = count()
+parked = set()   #  tasks waiting on an executor future
+completed = deque()   #  parked tasks whose future is done (from other threads)
+
+# Sockets stay registered with the selector (epoll on Linux) between
+# waits. Only sockets whose waiting tasks changed since the last select
+# are re-registered, so a task that waits on the same socket again
+# costs no system call.
+selector = DefaultSelector()
+registered = {}  #  sock -> (fd, events)
+changed = set()
+
+def update_registrations():
+    # Unregister first, in case a closed socket's descriptor was reused
+    for sock in sorted(changed, key=lambda s: s in recv_wait or s in send_wait):
+        events = ((EVENT_READ if sock in recv_wait else 0) |
+                  (EVENT_WRITE if sock in send_wait else 0))
+        fd, current = registered.get(sock, (None, 0))
+        if events == current:
+            continue
+        if not events:
+            del registered[sock]
+            selector.unregister(fd)
+            continue
+        if current:
+            selector.modify(fd, events)
+        else:
+            fd = selector.register(sock, events).fd
+        registered[sock] = (fd, events)
+    changed.clear()
+
+# Blocking work is handed to an executor. A done callback, run in the
+# executor's thread, queues the task on completed and writes a byte to a
+# self-pipe registered with the selector, which wakes up run().
+executor = None
+wakeup = None    #  (read fd, write fd)
+
+def wait_future(future, task):
+    global wakeup
+    if wakeup is None:
+        wakeup = os.pipe()
+        for fd in wakeup:
+            os.set_blocking(fd, False)
+        selector.register(wakeup[0], EVENT_READ, 'wakeup')
+    parked.add(task)
+    future.add_done_callback(lambda future: notify(task))
+
+def notify(task):
+    completed.append(task)
+    try:
+        os.write(wakeup[1], b'\0')
+    except BlockingIOError:
+        pass     # The pipe is full, so run() is being woken anyway
+
+def wake_completed():
+    while completed:
+        task = completed.popleft()
+        parked.discard(task)
+        tasks.append(task)
+
+def wake_sleepers():
+    now = time.monotonic()
+    while sleeping and sleeping[0][0] <= now:
+        tasks.append(heappop(sleeping)[2])
 
 def run():
-    while any([tasks, recv_wait, send_wait]):
+    while any([tasks, recv_wait, send_wait, sleeping, parked]):
+        if sleeping:
+            wake_sleepers()
+        if completed:
+            wake_completed()
         while not tasks:
-            can_recv, can_send, _ = select(recv_wait, send_wait, [])
-            for s in can_recv:
-                tasks.append(recv_wait.pop(s))
-            for s in can_send:
-                tasks.append(send_wait.pop(s))
+            update_registrations()
+            timeout = max(sleeping[0][0] - time.monotonic(), 0) if sleeping else None
+            for key, events in selector.select(timeout):
+                if key.data == 'wakeup':
+                    os.read(wakeup[0], 4096)
+                    wake_completed()
+                    continue
+                sock = key.fileobj
+                if events & EVENT_READ and sock in recv_wait:
+                    tasks.append(recv_wait.pop(sock))
+                if events & EVENT_WRITE and sock in send_wait:
+                    tasks.append(send_wait.pop(sock))
+                changed.add(sock)
+            if sleeping:
+                wake_sleepers()
         task = tasks.popleft()
         try:
             reason, resource = task.send(None)
             if reason == 'recv':
                 recv_wait[resource] = task
+                changed.add(resource)
             elif reason == 'send':
                 send_wait[resource] = task
+                changed.add(resource)
+            elif reason == 'sleep':
+                heappush(sleeping, (time.monotonic() + resource, next(sequence), task))
+            elif reason == 'future':
+                wait_future(resource, task)
             else:
                 raise RuntimeError('Unknown reason %r' % reason)
         except StopIteration:
             print('Task done')
 
+def sleep(seconds):
+    yield 'sleep', seconds
+
+def run_in_executor(func, *args, executor=None):
+    '''
+    Run func(*args) in an executor (a shared ThreadPoolExecutor unless
+    one is given, such as a ProcessPoolExecutor for CPU-bound work) and
+    return its result. Other tasks keep running in the meantime.
+    '''
+    if executor is None:
+        executor = get_executor()
+    future = executor.submit(func, *args)
+    yield 'future', future
+    return future.result()
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor()
+    return executor
+
 class GenSocket:
     def __init__(self, sock):
+        # Non-blocking, so that a send on a writable socket sends what
+        # fits and returns instead of stalling every task
+        sock.setblocking(False)
         self.sock = sock
 
     def accept(self):
@@ -45,6 +159,39 @@ class GenSocket:
         yield 'send', self.sock
         return self.sock.send(data)
 
+    def recv_into(self, buffer, nbytes=0):
+        yield 'recv', self.sock
+        return self.sock.recv_into(buffer, nbytes)
+
+    def sendall(self, data):
+        '''
+        Send all of data, waiting as needed. A partial send continues
+        from a memoryview, so the data is never copied.
+        '''
+        yield 'send', self.sock
+        nsent = self.sock.send(data)
+        if nsent < len(data):
+            view = memoryview(data)[nsent:]
+            while view:
+                yield 'send', self.sock
+                view = view[self.sock.send(view):]
+
+    def sendmsg(self, buffers):
+        '''
+        Send all of a list of buffers (say, a header and a payload) with
+        vectored writes instead of joining them first
+        '''
+        while buffers:
+            yield 'send', self.sock
+            nsent = self.sock.sendmsg(buffers)
+            for n, buf in enumerate(buffers):
+                if nsent < len(buf):
+                    buffers = [memoryview(buf)[nsent:], *buffers[n+1:]]
+                    break
+                nsent -= len(buf)
+            else:
+                return
+
     def __getattr__(self, name):
         return getattr(self.sock, name)
 
@@ -59,11 +206,13 @@ def tcp_server(address, handler):
         
 def echo_handler(client, address):
     print('Connection from', address)
+    buffer = bytearray(1000)
+    view = memoryview(buffer)
     while True:
-        data = yield from client.recv(1000)
-        if not data:
+        nbytes = yield from client.recv_into(buffer)
+        if not nbytes:
             break
-        yield from client.send(b'GOT:' + data)
+        yield from client.sendmsg([b'GOT:', view[:nbytes]])
     print('Connection closed')
 
 if __name__ == '__main__':
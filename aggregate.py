@@ -0,0 +1,201 @@
+# aggregate.py
+#
+# Group-by and aggregation over columnar data from colreader. Uses
+# NumPy when it is installed and falls back to plain arrays otherwise.
+
+import array
+import heapq
+from operator import itemgetter
+
+from colreader import EncodedColumn
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def _column(data, key):
+    '''
+    Resolve key to column storage. key is either a column name or
+    a column object (e.g. one produced by derive()).
+    '''
+    return data.column(key) if isinstance(key, str) else key
+
+
+def _encode(column):
+    '''
+    Return column as an EncodedColumn, encoding it if necessary
+    '''
+    if isinstance(column, EncodedColumn):
+        return column
+    return EncodedColumn(column)
+
+
+def _as_numpy(values):
+    if isinstance(values, array.array):
+        return np.frombuffer(values, dtype=values.typecode)
+    return np.asarray(values)
+
+
+def derive(column, func):
+    '''
+    Make a new encoded column by applying func to each distinct value
+    of column. func only runs once per distinct value, not once per row.
+    '''
+    column = _encode(column)
+    result = EncodedColumn()
+    remap = array.array('i', (result.encode(func(label)) for label in column.labels))
+    if np is not None:
+        result.codes = array.array('i', _as_numpy(remap)[_as_numpy(column.codes)].tobytes())
+    else:
+        result.codes = array.array('i', (remap[c] for c in column.codes))
+    return result
+
+
+class GroupBy:
+    '''
+    Rows of a DataCollection grouped by one or more key columns.
+    Single keys produce plain group labels, multiple keys produce tuples.
+    '''
+
+    def __init__(self, data, *keys):
+        encoded = [_encode(_column(data, key)) for key in keys]
+        if len(encoded) == 1:
+            self._compact(encoded[0])
+        elif np is not None:
+            self._combine_numpy(encoded)
+        else:
+            self._combine(encoded)
+
+    def _compact(self, col):
+        # Keep only the labels that occur. A sliced column shares its
+        # parent's whole label table.
+        if np is not None:
+            codes = _as_numpy(col.codes)
+            used = np.flatnonzero(np.bincount(codes, minlength=len(col.labels)))
+            if len(used) == len(col.labels):
+                self.codes = col.codes
+            else:
+                remap = np.zeros(len(col.labels), dtype=np.int32)
+                remap[used] = np.arange(len(used), dtype=np.int32)
+                self.codes = remap[codes]
+            self.groups = [col.labels[c] for c in used.tolist()]
+        else:
+            lookup = {}
+            self.codes = array.array('i', (lookup.setdefault(c, len(lookup))
+                                           for c in col.codes))
+            self.groups = [col.labels[c] for c in lookup]
+
+    def _combine(self, encoded):
+        lookup = {}
+        codes = array.array('i')
+        for combo in zip(*(col.codes for col in encoded)):
+            code = lookup.get(combo)
+            if code is None:
+                code = lookup[combo] = len(lookup)
+            codes.append(code)
+        self.codes = codes
+        self.groups = [tuple(col.labels[c] for col, c in zip(encoded, combo))
+                       for combo in lookup]
+
+    def _combine_numpy(self, encoded):
+        # Mixed-radix combination of the per-column codes
+        combined = np.zeros(len(encoded[0]), dtype=np.int64)
+        for col in encoded:
+            combined = combined * len(col.labels) + _as_numpy(col.codes)
+        unique, inverse = np.unique(combined, return_inverse=True)
+        self.codes = inverse.astype(np.int32)
+        parts = []
+        for col in reversed(encoded):
+            unique, rem = np.divmod(unique, len(col.labels))
+            parts.append([col.labels[c] for c in rem.tolist()])
+        self.groups = list(zip(*reversed(parts)))
+
+    def count(self):
+        '''
+        Return a dict mapping each group to its number of rows
+        '''
+        if np is not None:
+            totals = np.bincount(_as_numpy(self.codes), minlength=len(self.groups)).tolist()
+        else:
+            totals = [0] * len(self.groups)
+            for c in self.codes:
+                totals[c] += 1
+        return dict(zip(self.groups, totals))
+
+    def sum(self, column):
+        '''
+        Return a dict mapping each group to the sum of column over its rows
+        '''
+        if np is not None:
+            values = _as_numpy(column)
+            totals = np.bincount(_as_numpy(self.codes), weights=values,
+                                 minlength=len(self.groups))
+            if values.dtype.kind in 'iu':
+                totals = totals.round().astype(np.int64)
+            totals = totals.tolist()
+        else:
+            totals = [0] * len(self.groups)
+            for c, v in zip(self.codes, column):
+                totals[c] += v
+        return dict(zip(self.groups, totals))
+
+
+def group_by(data, *keys):
+    return GroupBy(data, *keys)
+
+
+def count(data, *keys):
+    return GroupBy(data, *keys).count()
+
+
+def total(data, column, *keys):
+    '''
+    Sum column grouped by keys
+    '''
+    return GroupBy(data, *keys).sum(_column(data, column))
+
+
+def select(data, **conditions):
+    '''
+    Return the indices of the rows where every column equals the given
+    value, e.g. select(data, route='22', date='02/02/2011')
+    '''
+    columns = []
+    for name, value in conditions.items():
+        column = _encode(data.column(name))
+        code = column._lookup.get(value)
+        if code is None:
+            return []
+        columns.append((column.codes, code))
+
+    if np is not None:
+        mask = np.ones(len(data), dtype=bool)
+        for codes, code in columns:
+            mask &= _as_numpy(codes) == code
+        return np.flatnonzero(mask).tolist()
+
+    codes, code = columns[0]
+    rows = [n for n, c in enumerate(codes) if c == code]
+    for codes, code in columns[1:]:
+        rows = [n for n in rows if codes[n] == code]
+    return rows
+
+
+def distinct(data, key):
+    '''
+    Return the list of distinct values appearing in a column
+    '''
+    column = _encode(_column(data, key))
+    if np is not None:
+        used = np.unique(_as_numpy(column.codes)).tolist()
+    else:
+        used = sorted(set(column.codes))
+    return [column.labels[c] for c in used]
+
+
+def top_k(results, k):
+    '''
+    Return the k (group, value) pairs with the largest values
+    '''
+    return heapq.nlargest(k, results.items(), key=itemgetter(1))
@@ -0,0 +1,69 @@
+# bench_tableformat.py
+#
+# print_table with 1M rows. "old" is the original formatter: the
+# ColumnFormatMixin / UpperHeadersMixin composition over a text formatter
+# that formats each cell separately and prints every row, fed one row at
+# a time from getattr(). "compiled" is create_formatter() with its
+# single-template renderer and batched writes.
+
+import os
+import sys
+from timeit import default_timer
+
+from stock import Stock
+from tableformat import create_formatter, print_table
+
+formats = ['%s', '%d', '%0.2f']
+
+
+class OldTextFormatter:
+    def __init__(self, out):
+        self.out = out
+
+    def headings(self, headers):
+        print(' '.join('%10s' % h for h in headers), file=self.out)
+        print(('-'*10 + ' ')*len(headers), file=self.out)
+
+    def row(self, rowdata):
+        print(' '.join('%10s' % d for d in rowdata), file=self.out)
+
+
+class OldColumnFormatMixin:
+    formats = []
+
+    def row(self, rowdata):
+        rowdata = [fmt % d for fmt, d in zip(self.formats, rowdata)]
+        super().row(rowdata)
+
+
+class OldUpperHeadersMixin:
+    def headings(self, headers):
+        super().headings([h.upper() for h in headers])
+
+
+class OldFormatter(OldUpperHeadersMixin, OldColumnFormatMixin, OldTextFormatter):
+    pass
+
+
+OldFormatter.formats = formats
+
+
+def old_print_table(records, fields, formatter):
+    formatter.headings(fields)
+    for r in records:
+        rowdata = [getattr(r, fieldname) for fieldname in fields]
+        formatter.row(rowdata)
+
+
+if __name__ == '__main__':
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    records = [Stock('GOOG', n, 490.1) for n in range(nrows)]
+    with open(os.devnull, 'w') as out:
+        for label, run in [('old', lambda: old_print_table(records, ['name', 'shares', 'price'],
+                                                           OldFormatter(out))),
+                           ('compiled', lambda: print_table(records, ['name', 'shares', 'price'],
+                                                            create_formatter('text', formats,
+                                                                             True, out)))]:
+            start = default_timer()
+            run()
+            print('%-10s %6.2f s' % (label, default_timer() - start))
@@ -0,0 +1,56 @@
+# bench_validate.py
+#
+# Per-call overhead of the validated decorator. "bind" is the old
+# wrapper that matched arguments with inspect.Signature.bind() on
+# every call, "compiled" is the current generated wrapper.
+
+import inspect
+from functools import wraps
+from timeit import timeit
+
+from validate import PositiveInteger, validated
+
+
+def validated_bind(func):
+    sig = inspect.signature(func)
+    annotations = dict(func.__annotations__)
+    retcheck = annotations.pop('return', None)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        errors = []
+        for name, validator in annotations.items():
+            try:
+                validator.check(bound.arguments[name])
+            except Exception as e:
+                errors.append(f'  {name}: {e}')
+        if errors:
+            raise TypeError('Bad Arguments\n' + '\n'.join(errors))
+        result = func(*args, **kwargs)
+        if retcheck:
+            try:
+                retcheck.check(result)
+            except Exception as e:
+                raise TypeError(f'Bad return: {e}') from None
+        return result
+    return wrapper
+
+
+class Holding:
+    def __init__(self, shares):
+        self.shares = shares
+
+    def sell(self, nshares: PositiveInteger):
+        self.shares -= nshares
+
+
+if __name__ == '__main__':
+    number = 200000
+    h = Holding(10 ** 9)
+    base = timeit(lambda: Holding.sell(h, 1), number=number)
+    for label, decorate in [('bind', validated_bind), ('compiled', validated)]:
+        sell = decorate(Holding.sell)
+        t = timeit(lambda: sell(h, 1), number=number)
+        print('%-10s %8.3f us/call  (%.3f us overhead)' %
+              (label, t / number * 1e6, (t - base) / number * 1e6))
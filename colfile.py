@@ -0,0 +1,219 @@
+# colfile.py
+#
+# A compact binary columnar file format for DataCollections and lists
+# of Structure instances, using only the standard library.
+#
+# Layout (all integers little-endian):
+#
+#   b'COLF' version:u16
+#   column data blocks, each padded to 8 bytes
+#   directory: ncols:u16 nrows:u64, then for each column
+#       name:str type:str typecode:u8 offset:u64 size:u64 labels:u64 nlabels:u32
+#   directory offset:u64 b'COLF'
+#
+# str is a u16 length followed by UTF-8 bytes. Numeric columns are raw
+# array.array data. Other columns are dictionary-encoded: an 'i' array
+# of codes plus a label table of (u32 length, UTF-8 bytes) entries.
+
+import array
+import mmap
+import struct
+
+from colreader import DataCollection, EncodedColumn
+
+MAGIC = b'COLF'
+VERSION = 1
+
+_header = struct.Struct('<4sH')
+_trailer = struct.Struct('<Q4s')
+_dirhead = struct.Struct('<HQ')
+_colentry = struct.Struct('<cQQQI')
+_strlen = struct.Struct('<H')
+_labellen = struct.Struct('<I')
+
+# Schema type names
+_typenames = {int: 'int', float: 'float', str: 'str'}
+_numeric = {'int': 'q', 'float': 'd'}
+
+
+def _write_str(file, text):
+    data = text.encode('utf-8')
+    file.write(_strlen.pack(len(data)))
+    file.write(data)
+
+
+def _read_str(buf, offset):
+    (size,) = _strlen.unpack_from(buf, offset)
+    offset += _strlen.size
+    return str(buf[offset:offset + size], 'utf-8'), offset + size
+
+
+def _pad(file):
+    file.write(b'\0' * (-file.tell() % 8))
+
+
+def _make_column(typename, values):
+    if typename in _numeric:
+        return array.array(_numeric[typename], values)
+    return EncodedColumn(values)
+
+
+def storable(cls):
+    '''
+    Return True if instances of cls can be written to a column file:
+    a Structure whose fields are all int, float or str
+    '''
+    return (hasattr(cls, 'new_trusted') and bool(cls._fields) and
+            all(func in _typenames for func in cls._types))
+
+
+def _columns_from_instances(records, cls):
+    columns = {}
+    for name, func in zip(cls._fields, cls._types):
+        values = [getattr(r, name) for r in records]
+        typename = _typenames.get(func) or (_typenames.get(type(values[0]), 'str')
+                                            if values else 'str')
+        columns[name] = (typename, _make_column(typename, values))
+    return columns
+
+
+def _columns_from_collection(data):
+    columns = {}
+    for name, col in zip(data.column_names, data.column_data):
+        if isinstance(col, EncodedColumn):
+            columns[name] = ('str', col)
+        elif isinstance(col, array.array):
+            columns[name] = ('float' if col.typecode in 'fd' else 'int', col)
+        else:
+            typename = _typenames.get(type(col[0]), 'str') if len(col) else 'str'
+            columns[name] = (typename, _make_column(typename, col))
+    return columns
+
+
+def write_colfile(filename, data, cls=None):
+    '''
+    Write a DataCollection or a list of Structure instances to filename.
+    cls gives the schema for a list, and is required if the list is empty.
+    '''
+    if isinstance(data, DataCollection):
+        columns = _columns_from_collection(data)
+    else:
+        if cls is None:
+            if not data:
+                raise ValueError('write_colfile() needs cls to write an empty list')
+            cls = type(data[0])
+        columns = _columns_from_instances(data, cls)
+
+    directory = []
+    with open(filename, 'wb') as file:
+        file.write(_header.pack(MAGIC, VERSION))
+        for name, (typename, col) in columns.items():
+            _pad(file)
+            if isinstance(col, EncodedColumn):
+                codes = col.codes
+                if not isinstance(codes, array.array):
+                    codes = array.array('i', codes)
+                offset = file.tell()
+                codes.tofile(file)
+                size = file.tell() - offset
+                labels = file.tell()
+                for label in col.labels:
+                    if not isinstance(label, str):
+                        raise TypeError(f'{name}: only str values can be encoded')
+                    encoded = label.encode('utf-8')
+                    file.write(_labellen.pack(len(encoded)))
+                    file.write(encoded)
+                directory.append((name, typename, b'i', offset, size, labels, len(col.labels)))
+            else:
+                offset = file.tell()
+                col.tofile(file)
+                directory.append((name, typename, col.typecode.encode(),
+                                  offset, file.tell() - offset, 0, 0))
+
+        _pad(file)
+        dir_offset = file.tell()
+        nrows = len(next(iter(columns.values()))[1]) if columns else 0
+        file.write(_dirhead.pack(len(directory), nrows))
+        for name, typename, typecode, offset, size, labels, nlabels in directory:
+            _write_str(file, name)
+            _write_str(file, typename)
+            file.write(_colentry.pack(typecode, offset, size, labels, nlabels))
+        file.write(_trailer.pack(dir_offset, MAGIC))
+
+
+def _read_directory(buf):
+    magic, version = _header.unpack_from(buf, 0)
+    dir_offset, trailer_magic = _trailer.unpack_from(buf, len(buf) - _trailer.size)
+    if magic != MAGIC or trailer_magic != MAGIC:
+        raise ValueError('Not a column file')
+    if version != VERSION:
+        raise ValueError(f'Unsupported column file version {version}')
+
+    ncols, nrows = _dirhead.unpack_from(buf, dir_offset)
+    offset = dir_offset + _dirhead.size
+    directory = []
+    for _ in range(ncols):
+        name, offset = _read_str(buf, offset)
+        typename, offset = _read_str(buf, offset)
+        entry = _colentry.unpack_from(buf, offset)
+        offset += _colentry.size
+        directory.append((name, typename, *entry))
+    return nrows, directory
+
+
+def _read_labels(buf, offset, count):
+    labels = []
+    for _ in range(count):
+        (size,) = _labellen.unpack_from(buf, offset)
+        offset += _labellen.size
+        labels.append(str(buf[offset:offset + size], 'utf-8'))
+        offset += size
+    return labels
+
+
+def read_colfile_schema(filename):
+    '''
+    Return the [(name, typename), ...] schema stored in filename
+    '''
+    with open(filename, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            directory = _read_directory(buf)[1]
+    return [(name, typename) for name, typename, *_ in directory]
+
+
+def read_colfile(filename, copy=False):
+    '''
+    Memory-map filename and return a read-only DataCollection. Numeric
+    columns and encoding codes are memoryviews straight into the file.
+    If copy is true, they are copied into arrays so that the collection
+    can be appended to, like one built by read_csv_as_arrays().
+    '''
+    with open(filename, 'rb') as file:
+        buf = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    nrows, directory = _read_directory(buf)
+    columns = {}
+    for name, typename, typecode, offset, size, labels, nlabels in directory:
+        data = buf[offset:offset + size].cast(typecode.decode())
+        if copy:
+            data = array.array(typecode.decode(), data)
+        if labels:
+            col = EncodedColumn()
+            col.codes = data
+            col.labels = _read_labels(buf, labels, nlabels)
+            col._lookup = {label: code for code, label in enumerate(col.labels)}
+            columns[name] = col
+        else:
+            columns[name] = data
+    return DataCollection(columns)
+
+
+def read_colfile_as_instances(filename, cls):
+    '''
+    Read a column file written from cls instances back into instances.
+    Values were validated when first stored, so they aren't re-checked.
+    '''
+    data = read_colfile(filename)
+    if tuple(data.column_names) != cls._fields:
+        raise ValueError(f'{filename} has fields {data.column_names}, expected {cls._fields}')
+    return [cls.new_trusted(*values) for values in zip(*data.column_data)]
@@ -0,0 +1,377 @@
+# colreader.py
+
+import array
+import collections
+import collections.abc
+import csv
+import io
+import itertools
+import logging
+import mmap
+import re
+
+log = logging.getLogger(__name__)
+
+# Column types that can be stored unboxed in an array.array
+_typecodes = {
+    int: 'q',
+    float: 'd',
+}
+
+
+class EncodedColumn(collections.abc.Sequence):
+    '''
+    A dictionary-encoded column. Each distinct value is stored once
+    in a lookup table and rows hold small integer codes into it.
+    '''
+
+    def __init__(self, values=()):
+        self.codes = array.array('i')
+        self.labels = []
+        self._lookup = {}
+        for value in values:
+            self.append(value)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            col = EncodedColumn()
+            col.codes = self.codes[index]
+            col.labels = self.labels
+            col._lookup = self._lookup
+            return col
+        return self.labels[self.codes[index]]
+
+    def __iter__(self):
+        labels = self.labels
+        return (labels[c] for c in self.codes)
+
+    def encode(self, value):
+        '''
+        Return the code for value, adding it to the lookup table if needed
+        '''
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.labels)
+            self.labels.append(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+
+def build_index(columns):
+    '''
+    Build a hash index mapping key values to lists of row numbers.
+    A single column is keyed by value, several columns by tuple.
+    '''
+    index = collections.defaultdict(list)
+    keys = columns[0] if len(columns) == 1 else zip(*columns)
+    for rowno, key in enumerate(keys):
+        index[key].append(rowno)
+    return dict(index)
+
+
+class IndexMixin:
+    '''
+    Hash indexes over one or more columns. Requires column(name).
+    Indexes are built on first use and cached until the data changes.
+    '''
+    _indexes = None
+
+    def index(self, *keys):
+        if self._indexes is None:
+            self._indexes = {}
+        index = self._indexes.get(keys)
+        if index is None:
+            index = self._indexes[keys] = build_index([self.column(key) for key in keys])
+        return index
+
+    def lookup(self, **conditions):
+        '''
+        Return the rows matching all of the given column values,
+        e.g. lookup(route='22', date='02/02/2011')
+        '''
+        keys = tuple(sorted(conditions))
+        if len(keys) == 1:
+            key = conditions[keys[0]]
+        else:
+            key = tuple(conditions[name] for name in keys)
+        return [self[rowno] for rowno in self.index(*keys).get(key, ())]
+
+    def invalidate_indexes(self):
+        self._indexes = None
+
+
+class DataCollection(IndexMixin, collections.abc.Sequence):
+    def __init__(self, columns):
+        self.column_names = list(columns)
+        self.column_data = list(columns.values())
+
+    def __len__(self):
+        return len(self.column_data[0])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return DataCollection(dict(zip(self.column_names,
+                                           (col[index] for col in self.column_data))))
+        return dict(zip(self.column_names,
+                        (col[index] for col in self.column_data)))
+
+    def column(self, name):
+        '''
+        Return the raw storage for a single column
+        '''
+        return self.column_data[self.column_names.index(name)]
+
+    def validate(self, validators):
+        '''
+        Check columns with a dict of {name: Validator}, one check_many()
+        call per column. Encoded columns only check their distinct values.
+        '''
+        for name, validator in validators.items():
+            col = self.column(name)
+            validator.check_many(col.labels if isinstance(col, EncodedColumn) else col)
+
+    def append(self, record):
+        for name, col in zip(self.column_names, self.column_data):
+            col.append(record[name])
+        self.invalidate_indexes()
+
+
+class CSVScanner:
+    '''
+    Scan a CSV file through mmap in large blocks. Iterating yields, for
+    each block, a list of raw bytes fields per selected column. When all
+    columns are read, a block is split into fields with a couple of bytes
+    operations and each column is a slice of the field list. When only
+    some are, a regex matching whole lines captures just the selected
+    fields, so no bytes are built for the others. Fields are never
+    decoded unless a column asks for them. Blocks with quotes or ragged
+    rows go through csv instead. Blocks never end inside a quoted field.
+    The file is assumed to be UTF-8.
+    '''
+    blocksize = 1 << 18
+
+    def __init__(self, filename, types, columns=None):
+        self.file = open(filename, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        headers = next(csv.reader([self.map.readline().decode('utf-8')]))
+        self.ncolumns = len(headers)
+        self.names = list(headers if columns is None else columns)
+        self.indices = [headers.index(name) for name in self.names]
+        self.types = [types[n] for n in self.indices]
+
+        selected = sorted(set(self.indices))
+        if len(selected) < self.ncolumns:
+            fields = [b'([^,\n]*)' if n in selected else b'[^,\n]*'
+                      for n in range(self.ncolumns)]
+            self._pattern = re.compile(b'^' + b','.join(fields) + b'$', re.M)
+            self._groups = [selected.index(n) for n in self.indices]
+        else:
+            self._pattern = None
+
+    def _blocks(self):
+        buf = self.map
+        start = buf.tell()
+        while start < len(buf):
+            end = buf.rfind(b'\n', start, start + self.blocksize) + 1
+            if end <= start:
+                end = buf.find(b'\n', start + self.blocksize) + 1 or len(buf)
+            block = buf[start:end]
+            # An odd number of quotes means the block ends in a quoted
+            # field. Extend it line by line until the quote is closed.
+            quotes = block.count(b'"')
+            while quotes % 2 and end < len(buf):
+                more = buf[end:buf.find(b'\n', end) + 1 or len(buf)]
+                quotes += more.count(b'"')
+                block += more
+                end += len(more)
+            yield block
+            start = end
+
+    def _split(self, block):
+        if b'"' not in block:
+            if b'\r' in block:
+                block = block.replace(b'\r\n', b'\n')
+            if self._pattern is not None:
+                # Only lines with exactly the right number of fields match.
+                # Anything else means ragged rows and goes through csv.
+                block = block.rstrip(b'\n')
+                matches = self._pattern.findall(block)
+                if len(matches) == block.count(b'\n') + 1:
+                    columns = [matches] if self._pattern.groups == 1 else list(zip(*matches))
+                    return [columns[n] for n in self._groups]
+                return self._split_csv(block)
+
+            lines = block.rstrip(b'\n').split(b'\n')
+            # Every line must have exactly the right number of fields,
+            # or the stride slices would shift values between rows
+            if set(map(bytes.count, lines, itertools.repeat(b','))) == {self.ncolumns - 1}:
+                fields = b','.join(lines).split(b',')
+                step = self.ncolumns
+                return [fields[n::step] for n in self.indices]
+        return self._split_csv(block)
+
+    def _split_csv(self, block):
+        text = io.StringIO(block.decode('utf-8'), newline='')
+        rows = []
+        for row in csv.reader(text):
+            if len(row) == self.ncolumns:
+                rows.append(row)
+            elif row:
+                log.warning('Bad row: %s', row)
+        return [[row[n].encode('utf-8') for row in rows] for n in self.indices]
+
+    def __iter__(self):
+        for block in self._blocks():
+            yield self._split(block)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ty, val, tb):
+        self.close()
+
+
+def field_converter(func):
+    '''
+    Return a function that converts one raw bytes field with func.
+    int() and float() accept bytes as is, everything else gets a
+    decoded str value.
+    '''
+    if func in _typecodes:
+        return func
+    if func is str:
+        return bytes.decode
+    return lambda raw: func(raw.decode('utf-8'))
+
+
+def _convert(conv, raw, name, bad):
+    '''
+    Convert a list of raw fields with conv. Fields that don't convert
+    are logged and their row numbers are added to the set bad.
+    '''
+    try:
+        return list(map(conv, raw))
+    except ValueError:
+        pass
+    values = []
+    for n, value in enumerate(raw):
+        try:
+            values.append(conv(value))
+        except ValueError:
+            log.warning('Bad value %r for %s, skipping row', value, name)
+            bad.add(n)
+            values.append(None)
+    return values
+
+
+def _encode(col, lookup, func, raw, name, bad):
+    '''
+    Return the codes in the encoded column col for a list of raw fields,
+    converting each distinct field with func only once. lookup maps raw
+    fields to codes (None if the field didn't convert).
+    '''
+    failed = set()
+    for value in dict.fromkeys(raw):
+        if value not in lookup:
+            try:
+                lookup[value] = col.encode(func(value.decode('utf-8')))
+            except ValueError:
+                lookup[value] = None
+        if lookup[value] is None:
+            failed.add(value)
+    if failed:
+        for n, value in enumerate(raw):
+            if value in failed:
+                log.warning('Bad value %r for %s, skipping row', value, name)
+                bad.add(n)
+    return list(map(lookup.__getitem__, raw))
+
+
+def _drop_rows(columns, bad):
+    '''
+    Remove the rows numbered in bad from each list of values in columns
+    '''
+    if not bad:
+        return columns
+    return [[value for n, value in enumerate(col) if n not in bad] for col in columns]
+
+
+def read_csv_as_columns(filename, types, *, columns=None):
+    '''
+    Read CSV data into a collection of columns stored as lists.
+    columns optionally selects which columns to read. Rows with values
+    that don't convert are logged and skipped.
+    '''
+    with CSVScanner(filename, types, columns) as scanner:
+        data = {name: [] for name in scanner.names}
+        convert = [field_converter(func) for func in scanner.types]
+        for block in scanner:
+            bad = set()
+            values = [_convert(conv, raw, name, bad)
+                      for conv, raw, name in zip(convert, block, scanner.names)]
+            for col, vals in zip(data.values(), _drop_rows(values, bad)):
+                col.extend(vals)
+    return DataCollection(data)
+
+
+def read_csv_as_arrays(filename, types, *, columns=None, validators=None):
+    '''
+    Read CSV data into a compact collection of columns. Numeric columns
+    are stored in arrays and all other columns are dictionary-encoded,
+    decoding each distinct value only once. columns optionally selects
+    which columns to read and validators is an optional dict of
+    {name: Validator} checked per column. Rows with values that don't
+    convert are logged and skipped.
+    '''
+    with CSVScanner(filename, types, columns) as scanner:
+        data = {}
+        lookups = {}
+        for name, func in zip(scanner.names, scanner.types):
+            if func in _typecodes:
+                data[name] = array.array(_typecodes[func])
+            else:
+                data[name] = EncodedColumn()
+                lookups[name] = {}
+
+        for block in scanner:
+            bad = set()
+            values = []
+            for name, func, raw in zip(scanner.names, scanner.types, block):
+                if func in _typecodes:
+                    values.append(_convert(func, raw, name, bad))
+                else:
+                    values.append(_encode(data[name], lookups[name], func, raw, name, bad))
+            for col, vals in zip(data.values(), _drop_rows(values, bad)):
+                if isinstance(col, EncodedColumn):
+                    col.codes.extend(vals)
+                else:
+                    col.extend(vals)
+
+    data = DataCollection(data)
+    if validators:
+        data.validate(validators)
+    return data
+
+
+if __name__ == '__main__':
+    import sys
+    import tracemalloc
+
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'Data/ctabus.csv'
+    types = [str, str, str, int]
+    for reader in (read_csv_as_columns, read_csv_as_arrays):
+        tracemalloc.start()
+        data = reader(filename, types)
+        print(reader.__name__, 'Memory Use: Current %d, Peak %d' %
+              tracemalloc.get_traced_memory())
+        del data
+        tracemalloc.stop()
@@ -5,6 +5,10 @@ import sys
 from collections import namedtuple, defaultdict, Counter
 import tracemalloc
 
+import aggregate
+from colreader import DataCollection, IndexMixin
+from readrides import read_rides_as_arrays
+
 
 class Row:
     def __init__(self, route, date, daytype, rides):
@@ -105,11 +109,17 @@ def read_rides_as_class_w_slots(filename):
 
 def num_routes(data):
     # Q: How many bus routes exist in Chicago?
+    if isinstance(data, DataCollection):
+        return len(aggregate.distinct(data, 'route'))
     return len({d['route'] for d in data})
 
 
 def riders_by_route_by_day(data, route, date):
     # Q: How many people rode the number 22 bus on February 2, 2011? What about any route on any date of your choosing?
+    if isinstance(data, IndexMixin):
+        # Hash index on (route, date) is built once and reused
+        return sum(d['rides'] for d in data.lookup(route=route, date=date))
+
     tracemalloc.start()
 
     # # As a list
@@ -130,10 +140,14 @@ def riders_by_route_by_day(data, route, date):
 
 def total_rides_by_route(data):
     # Q: What is the total number of rides taken on each bus route?
-    totals = {d["route"]: 0 for d in data}
+    if isinstance(data, DataCollection):
+        return aggregate.total(data, 'rides', 'route')
+
+    # Single pass so that data can be a lazy iterator of records
+    totals = defaultdict(int)
     for d in data:
         totals[d["route"]] += d["rides"]
-    return totals
+    return dict(totals)
 
 
 def greatest_difference(data, year1, year2):
@@ -148,6 +162,17 @@ def greatest_difference(data, year1, year2):
     #         increase[d["route"]] += d["rides"]
     # return sorted(increase.items(), key=lambda x: x[1])[-5:]
 
+    if isinstance(data, DataCollection):
+        years = aggregate.derive(data.column('date'), lambda date: date.split("/")[2])
+        totals = aggregate.total(data, 'rides', years, 'route')
+        increase = Counter()
+        for (year, route), rides in totals.items():
+            if year == year2:
+                increase[route] += rides
+            elif year == year1:
+                increase[route] -= rides
+        return aggregate.top_k(increase, 5)
+
     rides_by_year = defaultdict(Counter)
     for d in data:
         year = d["date"].split("/")[2]
@@ -158,8 +183,8 @@ def greatest_difference(data, year1, year2):
 
 
 if __name__ == '__main__':
-    filename = 'Data/ctabus.csv'
-    rows = read_rides_as_dictionary(filename)
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'Data/ctabus.csv'
+    rows = read_rides_as_arrays(filename)
     print(f"Total number of routes: {num_routes(rows)}")
     print(
         f"Total number of riders for 22 on 02/02/11: {riders_by_route_by_day(rows, '22', '02/02/2011')}")
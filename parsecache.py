@@ -0,0 +1,171 @@
+# parsecache.py
+#
+# On-disk cache of parsed CSV data. The first parse of a file is saved
+# as a colfile sidecar. Later loads memory-map the sidecar instead of
+# parsing again, as long as the file and the target schema are unchanged.
+#
+# Off by default. Turn it on with enable() or by setting PARSECACHE_DIR.
+
+import hashlib
+import logging
+import os
+
+import colfile
+
+log = logging.getLogger(__name__)
+
+
+class ParseCache:
+    '''
+    A directory of sidecar files. Each entry is keyed by the absolute
+    path of the source file and a schema. The source's size, mtime and
+    content hash are stored with it to detect stale entries. Total size
+    is kept under max_size by evicting the least recently used entries.
+    '''
+
+    def __init__(self, directory, max_size=256 << 20):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, filename, schema):
+        key = hashlib.sha1(repr((os.path.abspath(filename), schema)).encode()).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.colf', base + '.meta'
+
+    @staticmethod
+    def fingerprint(filename):
+        st = os.stat(filename)
+        with open(filename, 'rb') as file:
+            digest = hashlib.file_digest(file, 'sha1').hexdigest()
+        return f'{st.st_size} {st.st_mtime_ns} {digest}'
+
+    def load(self, filename, schema, parse, load):
+        '''
+        Return load(sidecar) for a fresh entry. Otherwise call parse(),
+        store its result and return it.
+        '''
+        data_path, meta_path = self._paths(filename, schema)
+        fingerprint = self.fingerprint(filename)
+        try:
+            with open(meta_path) as file:
+                stored = file.read()
+        except FileNotFoundError:
+            stored = None
+
+        if stored == fingerprint:
+            os.utime(meta_path)          # Mark as recently used
+            return load(data_path)
+        if stored is not None:
+            log.info('Evicting stale cache entry for %s', filename)
+            self._remove(data_path, meta_path)
+
+        data = parse()
+        if len(data):
+            try:
+                self._store(data, data_path, meta_path, fingerprint)
+            except Exception as e:
+                log.warning('Could not cache %s: %s', filename, e)
+        return data
+
+    def _store(self, data, data_path, meta_path, fingerprint):
+        # Temporary names are per process, so processes filling the same
+        # entry don't write over each other
+        suffix = f'.{os.getpid()}.tmp'
+        try:
+            colfile.write_colfile(data_path + suffix, data)
+            with open(meta_path + suffix, 'w') as file:
+                file.write(fingerprint)
+            os.replace(data_path + suffix, data_path)
+            os.replace(meta_path + suffix, meta_path)
+        finally:
+            self._remove(data_path + suffix, meta_path + suffix)
+        self.evict()
+
+    @staticmethod
+    def _remove(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def entries(self):
+        '''
+        Return [(last_used, size, data_path, meta_path), ...] oldest first
+        '''
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.meta'):
+                meta_path = os.path.join(self.directory, name)
+                data_path = meta_path[:-len('.meta')] + '.colf'
+                try:
+                    used = os.stat(meta_path).st_mtime_ns
+                    size = os.stat(data_path).st_size
+                except FileNotFoundError:
+                    continue
+                entries.append((used, size, data_path, meta_path))
+        return sorted(entries)
+
+    def evict(self):
+        '''
+        Remove least recently used entries until under max_size
+        '''
+        entries = self.entries()
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, data_path, meta_path in entries:
+            if total <= self.max_size:
+                break
+            self._remove(meta_path, data_path)
+            total -= size
+
+    def clear(self):
+        for _, _, data_path, meta_path in self.entries():
+            self._remove(meta_path, data_path)
+
+
+_cache = None
+
+
+def enable(directory=None, max_size=256 << 20):
+    '''
+    Turn on the parse cache, storing sidecars in directory
+    '''
+    global _cache
+    if directory is None:
+        directory = os.path.join(os.path.expanduser('~'), '.cache', 'parsecache')
+    _cache = ParseCache(directory, max_size)
+    return _cache
+
+
+def disable():
+    global _cache
+    _cache = None
+
+
+def cached(filename, schema, parse, load):
+    '''
+    Return parse() through the cache if it's enabled
+    '''
+    if _cache is None:
+        return parse()
+    return _cache.load(filename, schema, parse, load)
+
+
+def class_schema(cls, *options):
+    '''
+    Schema key for parsing into instances of cls
+    '''
+    return (cls.__module__, cls.__qualname__, tuple(cls._fields),
+            tuple(getattr(t, '__name__', repr(t)) for t in cls._types), options)
+
+
+def types_schema(types, *options):
+    '''
+    Schema key for parsing with a list of conversion functions
+    '''
+    return (tuple(getattr(t, '__name__', repr(t)) for t in types), options)
+
+
+if os.environ.get('PARSECACHE_DIR'):
+    enable(os.environ['PARSECACHE_DIR'])
@@ -1,47 +1,313 @@
 # reader.py
 
+import bz2
 import csv
+import gzip
+import io
 import logging
+import lzma
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import colfile
+import parsecache
+import validate
 
 log = logging.getLogger(__name__)
 
 
-def convert_csv(lines, converter, *, headers=None):
+# Compressed input. The format is picked by magic number, falling back
+# to the file extension (raw .lzma streams have no reliable magic).
+
+_magic = [
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+]
+
+_extensions = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.lzma': lzma.open,
+}
+
+
+def _decompressor(filename):
+    with open(filename, 'rb') as file:
+        head = file.read(6)
+    for magic, opener in _magic:
+        if head.startswith(magic):
+            return opener
+    return _extensions.get(os.path.splitext(filename)[1])
+
+
+class PrefetchReader(io.RawIOBase):
+    '''
+    Read a binary stream in a background thread, a few chunks ahead of
+    the consumer. Wrapped around a decompressing file, decompression
+    (which releases the GIL) overlaps with CSV parsing.
+    '''
+
+    def __init__(self, raw, chunksize=1 << 18, depth=4):
+        self._raw = raw
+        self._chunksize = chunksize
+        self._queue = queue.Queue(depth)
+        self._pending = memoryview(b'')
+        self._eof = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fill(self):
+        try:
+            while chunk := self._raw.read(self._chunksize):
+                if not self._put(chunk):
+                    return
+        except Exception as e:
+            self._put(e)
+        self._put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._pending:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+                return 0
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+            self._pending = memoryview(item)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stopped.set()
+            self._thread.join()
+            self._raw.close()
+        super().close()
+
+
+def open_csv(filename):
+    '''
+    Open a CSV file for reading as text. gzip, bz2 and xz/lzma files
+    are decompressed on the fly in a background thread.
+    '''
+    opener = _decompressor(filename)
+    if opener is None:
+        return open(filename)
+    return io.TextIOWrapper(io.BufferedReader(PrefetchReader(opener(filename, 'rb'))))
+
+
+def iter_convert_csv(lines, converter, *, headers=None):
+    '''
+    Lazily convert CSV lines, yielding one converted record at a time
+    '''
     rows = csv.reader(lines)
     if headers is None:
-        headers = next(rows)
+        headers = next(rows, None)
+        if headers is None:
+            return
 
-    records = []
     for rowno, row in enumerate(rows, start=1):
         try:
-            records.append(converter(headers, row))
+            yield converter(headers, row)
         except ValueError as e:
             log.warning('Row %s: Bad row: %s', rowno, row)
             log.debug('Row %s: Reason: %s', rowno, row)
-    return records
+
+
+def convert_csv(lines, converter, *, headers=None):
+    return list(iter_convert_csv(lines, converter, headers=headers))
+
+
+# Converters are partials of module-level functions so that they can
+# be pickled and sent to worker processes
+
+def _row_to_dict(types, headers, row):
+    return {name: func(val) for name, func, val in zip(headers, types, row)}
+
+
+def _row_to_instance(cls, headers, row):
+    return cls.from_row(row)
+
+
+def _row_to_trusted_instance(cls, headers, row):
+    return cls.from_row_trusted(row)
+
+
+def _dict_converter(types):
+    return partial(_row_to_dict, types)
+
+
+def _instance_converter(cls, trusted=False):
+    return partial(_row_to_trusted_instance if trusted else _row_to_instance, cls)
 
 
 def csv_as_dicts(lines, types, *, headers=None):
-    return convert_csv(lines,
-                       lambda headers, row: {name: func(val) for name, func, val in zip(headers, types, row)})
+    return convert_csv(lines, _dict_converter(types), headers=headers)
+
+
+def csv_as_instances(lines, cls, *, headers=None, trusted=False):
+    return convert_csv(lines, _instance_converter(cls, trusted), headers=headers)
+
+
+def iter_csv_as_dicts(lines, types, *, headers=None):
+    return iter_convert_csv(lines, _dict_converter(types), headers=headers)
+
 
+def iter_csv_as_instances(lines, cls, *, headers=None, trusted=False):
+    return iter_convert_csv(lines, _instance_converter(cls, trusted), headers=headers)
 
-def csv_as_instances(lines, cls, *, headers=None):
-    return convert_csv(lines,
-                       lambda headers, row: cls.from_row(row))
 
+def _iter_file(filename, lines_converter, *args, **kwargs):
+    # Keep the file open only as long as the generator is alive
+    with open_csv(filename) as file:
+        yield from lines_converter(file, *args, **kwargs)
 
-def read_csv_as_dicts(filename, types, *, headers=None):
+
+def read_csv_as_dicts(filename, types, *, headers=None, lazy=False):
     '''
-    Read CSV data into a list of dictionaries with optional type conversion
+    Read CSV data into a list of dictionaries with optional type conversion.
+    If lazy is true, return an iterator that yields one record at a time.
     '''
-    with open(filename) as file:
+    if lazy:
+        return _iter_file(filename, iter_csv_as_dicts, types, headers=headers)
+    with open_csv(filename) as file:
         return csv_as_dicts(file, types, headers=headers)
 
 
-def read_csv_as_instances(filename, cls, *, headers=None):
+def read_csv_as_instances(filename, cls, *, headers=None, lazy=False, trusted=False):
+    '''
+    Read CSV data into a list of instances.
+    If lazy is true, return an iterator that yields one instance at a time.
+    If trusted is true, instances are built without running validators.
+    '''
+    if lazy:
+        return _iter_file(filename, iter_csv_as_instances, cls,
+                          headers=headers, trusted=trusted)
+
+    def parse():
+        with open_csv(filename) as file:
+            return csv_as_instances(file, cls, headers=headers, trusted=trusted)
+
+    if headers is not None or not colfile.storable(cls):
+        return parse()
+    # Entries parsed with validation off or sampled hold values that
+    # were never checked, so the mode is part of the key
+    schema = parsecache.class_schema(cls, trusted, validate.policy.mode)
+    return parsecache.cached(filename, schema, parse,
+                             lambda path: colfile.read_colfile_as_instances(path, cls))
+
+
+# Parallel ingestion. The file is split into byte ranges that end on
+# line boundaries and each range is parsed in a worker process. Note:
+# quoted fields containing newlines are not supported.
+
+_MIN_CHUNK_SIZE = 1 << 20
+
+
+def _chunk_ranges(file, start, nchunks):
+    '''
+    Split a binary file from offset start into at most nchunks
+    (start, end) byte ranges aligned on line boundaries
+    '''
+    size = os.fstat(file.fileno()).st_size
+    step = max((size - start) // nchunks, _MIN_CHUNK_SIZE)
+    ranges = []
+    while start < size:
+        file.seek(min(start + step, size))
+        file.readline()
+        end = file.tell()
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _convert_chunk(filename, start, end, converter, headers):
+    '''
+    Worker: convert one byte range. Returns the records, the bad rows
+    as (local rowno, row, reason) and the number of rows seen.
+    '''
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    records = []
+    errors = []
+    rowno = 0
+    for rowno, row in enumerate(csv.reader(io.TextIOWrapper(io.BytesIO(data))), start=1):
+        try:
+            records.append(converter(headers, row))
+        except ValueError as e:
+            errors.append((rowno, row, str(e)))
+    return records, errors, rowno
+
+
+def convert_csv_parallel(filename, converter, *, headers=None, workers=None):
+    '''
+    Convert a CSV file using a pool of worker processes. Records are
+    returned in file order and bad rows are logged with their row
+    numbers in the whole file.
+    '''
+    if _decompressor(filename):
+        # Compressed data can't be split into byte ranges
+        with open_csv(filename) as file:
+            return convert_csv(file, converter, headers=headers)
+
+    workers = workers or os.cpu_count()
+    with open(filename, 'rb') as file:
+        if headers is None:
+            headers = next(csv.reader(io.TextIOWrapper(io.BytesIO(file.readline()))))
+        ranges = _chunk_ranges(file, file.tell(), workers * 4)
+
+    records = []
+    with ProcessPoolExecutor(workers) as pool:
+        results = pool.map(_convert_chunk,
+                           *zip(*[(filename, start, end, converter, headers)
+                                  for start, end in ranges]))
+        offset = 0
+        for chunk_records, errors, nrows in results:
+            records.extend(chunk_records)
+            for rowno, row, reason in errors:
+                log.warning('Row %s: Bad row: %s', offset + rowno, row)
+                log.debug('Row %s: Reason: %s', offset + rowno, reason)
+            offset += nrows
+    return records
+
+
+def read_csv_as_dicts_parallel(filename, types, *, headers=None, workers=None):
+    '''
+    Read CSV data into a list of dictionaries using multiple processes
+    '''
+    return convert_csv_parallel(filename, _dict_converter(types),
+                                headers=headers, workers=workers)
+
+
+def read_csv_as_instances_parallel(filename, cls, *, headers=None, workers=None,
+                                   trusted=False):
     '''
-    Read CSV data into a list of instances
+    Read CSV data into a list of instances using multiple processes
     '''
-    with open(filename) as file:
-        return csv_as_instances(file, cls, headers=headers)
+    return convert_csv_parallel(filename, _instance_converter(cls, trusted),
+                                headers=headers, workers=workers)
@@ -2,6 +2,10 @@
 
 import collections.abc as collections
 import csv
+from functools import partial
+from colfile import read_colfile
+from colreader import IndexMixin, read_csv_as_arrays
+import parsecache
 
 
 def read_rides_as_tuples(filename):
@@ -77,7 +81,7 @@ def read_rides_as_instances(filename):
     return records
 
 
-class RideData(collections.Sequence):
+class RideData(IndexMixin, collections.Sequence):
     def __init__(self):
         # Each value is a list with all of the values (a column)
         self.routes = []
@@ -115,16 +119,36 @@ class RideData(collections.Sequence):
         else:
             return NotImplemented
 
+    def column(self, name):
+        return {'route': self.routes,
+                'date': self.dates,
+                'daytype': self.daytypes,
+                'rides': self.numrides}[name]
+
     def append(self, d):
         self.routes.append(d['route'])
         self.dates.append(d['date'])
         self.daytypes.append(d['daytype'])
         self.numrides.append(d['rides'])
+        self.invalidate_indexes()
 
     def __getitems__(self, index):
         return
 
 
+def read_rides_as_arrays(filename):
+    '''
+    Read the bus ride data into compact columns. rides is stored in an
+    array and route, date and daytype are dictionary-encoded.
+    '''
+    types = [str, str, str, int]
+    # Cached columns are copied out of the file so the result can be
+    # appended to, the same as a fresh parse
+    return parsecache.cached(filename, parsecache.types_schema(types),
+                             lambda: read_csv_as_arrays(filename, types),
+                             partial(read_colfile, copy=True))
+
+
 if __name__ == '__main__':
     import tracemalloc
     tracemalloc.start()
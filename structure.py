@@ -1,23 +1,51 @@
 # structure.py
 
-from validate import Validator, validated
+from validate import Validator, validated, policy
 from collections import ChainMap
 
 
+def _slot_name(clsname, field):
+    # Storage slot for a field, named as if __field were mangled, so it
+    # can't clash with the single underscore names instances may use
+    return f'_{clsname.lstrip("_")}__{field}'
+
+
 class StructureMeta(type):
+    '''
+    Metaclass for structures. Passing slots=True in the class statement
+    stores each validated field in a private __slots__ entry, so instances
+    have no __dict__ (and can't be given any other attributes).
+    '''
     @classmethod
-    def __prepare__(meta, clsname, bases):
+    def __prepare__(meta, clsname, bases, **kwargs):
         return ChainMap({}, Validator.validators)
 
     @staticmethod
-    def __new__(meta, name, bases, methods):
+    def __new__(meta, name, bases, methods, *, slots=False):
         methods = methods.maps[0]
-        return super().__new__(meta, name, bases, methods)
+        if slots:
+            fields = [key for key, val in methods.items() if isinstance(val, Validator)]
+            methods['__slots__'] = tuple(_slot_name(name, field) for field in fields)
+        cls = super().__new__(meta, name, bases, methods)
+        if slots:
+            # Put the validators on top of the slot descriptors. An unknown
+            # attribute can't be set without a __dict__, so the name check
+            # in Structure.__setattr__ is not needed either.
+            for field in fields:
+                slot = vars(cls)[_slot_name(name, field)]
+                setattr(cls, field, methods[field].slot_property(slot))
+            cls.__setattr__ = object.__setattr__
+        return cls
+
+    def __init__(cls, name, bases, methods, **kwargs):
+        super().__init__(name, bases, methods)
 
 
 class Structure(metaclass=StructureMeta):
+    __slots__ = ()
     _fields = ()
     _types = ()
+    _validators = ()
 
     def __setattr__(self, name, value):
         if name.startswith('_') or name in self._fields:
@@ -34,19 +62,95 @@ class Structure(metaclass=StructureMeta):
         rowdata = [func(val) for func, val in zip(cls._types, row)]
         return cls(*rowdata)
 
+    @classmethod
+    def from_row_trusted(cls, row):
+        '''
+        Like from_row(), but the converted values are stored without
+        running the validators. Only use this on trusted data.
+        '''
+        self = object.__new__(cls)
+        self.__dict__.update(zip(cls._fields, (func(val) for func, val in zip(cls._types, row))))
+        return self
+
+    @classmethod
+    def _field_stores(cls, locs):
+        '''
+        Return, for each field, a line of code that stores a value into
+        it without going through its validator. The lines are format
+        strings taking the value.
+        '''
+        if '__slots__' in vars(cls):
+            for n, name in enumerate(cls._fields):
+                locs[f'_set{n}'] = vars(cls)[_slot_name(cls.__name__, name)].__set__
+            return [f'    _set{n}(self, {{}})\n' for n in range(len(cls._fields))]
+        return [f'    self.__dict__[{name!r}] = {{}}\n' for name in cls._fields]
+
     @classmethod
     def create_init(cls):
         '''
-        Create an __init__ method from _fields
+        Create an __init__ method from _fields. Whether to validate is
+        decided once per call, so when validation is sampled a sampled
+        instance has all of its fields checked.
         '''
         args = ','.join(cls._fields)
+        locs = {'_site': policy.site()}
         code = f'def __init__(self, {args}):\n'
-        for name in cls._fields:
-            code += f'    self.{name} = {name}\n'
-        locs = {}
+        code += '    if _site.sample():\n'
+        for n, (name, validator) in enumerate(zip(cls._fields, cls._validators)):
+            locs[f'_check{n}'] = validator.check
+            code += f'        {name} = _check{n}({name})\n'
+        code += ''.join(store.format(name)
+                        for store, name in zip(cls._field_stores(locs), cls._fields))
         exec(code, locs)
         cls.__init__ = locs['__init__']
 
+    @classmethod
+    def create_from_row(cls):
+        '''
+        Create from_row(), from_row_trusted() and new_trusted() methods
+        with the conversion and storage of each column unrolled
+        '''
+        args = ','.join(cls._fields)
+        convs = [f'_type{n}(row[{n}])' for n in range(len(cls._fields))]
+        locs = {f'_type{n}': func for n, func in enumerate(cls._types)}
+        locs['_new'] = object.__new__
+        locs['_policy'] = policy
+        stores = cls._field_stores(locs)
+
+        code = f'def from_row(cls, row):\n'
+        code += f'    if not _policy.enabled:\n'
+        code += f'        return cls.from_row_trusted(row)\n'
+        code += f'    return cls({", ".join(convs)})\n'
+        code += f'def from_row_trusted(cls, row):\n'
+        code += f'    self = _new(cls)\n'
+        code += ''.join(store.format(conv) for store, conv in zip(stores, convs))
+        code += f'    return self\n'
+        code += f'def new_trusted(cls, {args}):\n'
+        code += f'    self = _new(cls)\n'
+        code += ''.join(store.format(name) for store, name in zip(stores, cls._fields))
+        code += f'    return self\n'
+        exec(code, locs)
+        for name in ('from_row', 'from_row_trusted', 'new_trusted'):
+            # Don't replace methods a class defines for itself
+            if name not in vars(cls):
+                setattr(cls, name, classmethod(locs[name]))
+
+    @classmethod
+    def from_rows(cls, rows):
+        '''
+        Create instances from many rows at once. Each column is converted
+        and then validated in one check_many() pass, so the validators
+        don't run again per instance.
+        '''
+        columns = [list(map(func, column))
+                   for func, column in zip(cls._types, zip(*rows))]
+        for validator, column in zip(cls._validators, columns):
+            try:
+                validator.check_many(column)
+            except (TypeError, ValueError) as e:
+                raise type(e)(f'{validator.name}: {e}') from None
+        return [cls.new_trusted(*values) for values in zip(*columns)]
+
     @classmethod
     def __init_subclass__(cls):
         # Apply the validated decorator to subclasses
@@ -60,11 +164,13 @@ def validate_attributes(cls):
             validators.append(val)
         elif callable(val) and val.__annotations__:
             setattr(cls, name, validated(val))
+    cls._validators = tuple(validators)
     cls._fields = tuple([val.name for val in validators])
     cls._types = tuple([getattr(v, 'expected_type', lambda x: x)
                         for v in validators])
     if cls._fields:
         cls.create_init()
+        cls.create_from_row()
     return cls
 
 
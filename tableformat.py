@@ -1,14 +1,147 @@
-from abc import ABC, abstractmethod
+import re
+import sys
+from abc import ABC
+from collections.abc import Mapping
+from itertools import chain, islice
+from operator import attrgetter, itemgetter
+
+# A simple % conversion such as '%d', '%0.2f' or '%10s'
+_conversion = re.compile(r'%([-+ #0]*)(\d*)(\.\d+)?([a-zA-Z])')
+
+
+def merge_format(cell, fmt):
+    '''
+    Combine a cell template containing one %s conversion (e.g. '%10s'
+    or '<td>%s</td>') with a column format (e.g. '%0.2f') into a single
+    conversion (e.g. '%10.2f'). Returns None if they can't be combined.
+    '''
+    outer = _conversion.search(cell)
+    inner = _conversion.fullmatch(fmt)
+    if not outer or not inner or outer.group(4) != 's' or inner.group(2):
+        return None
+    flags, _, precision, conv = inner.groups()
+    width = outer.group(2)
+    if width:
+        # Without a width these flags had no effect. With one they would.
+        flags = flags.replace('0', '').replace('-', '')
+    return (cell[:outer.start()] + f'%{outer.group(1)}{flags}{width}{precision or ""}{conv}' +
+            cell[outer.end():])
 
 
 class TableFormatter(ABC):
-    @abstractmethod
-    def headings(self, headers):
+    '''
+    Base class for formatters. Subclasses either turn headings and rows
+    into text with format_headings() and format_row(), or override
+    headings() and row() to output them directly. Output goes to out
+    (sys.stdout by default).
+
+    Inside a "with formatter:" block output is collected in a buffer
+    and written out in chunks of about bufsize characters. Outside of
+    one, every call is written out immediately.
+    '''
+    bufsize = 1 << 16
+    batchsize = 1000
+
+    # Layout of a row: prefix + cells joined by separator + suffix
+    cell = '%s'
+    separator = ' '
+    prefix = ''
+    suffix = '\n'
+
+    # Optional per-column % formats applied to each cell
+    column_formats = None
+
+    def __init__(self, out=None):
+        self.out = out
+        self._buffer = []
+        self._buffered = 0
+        self._batching = 0
+        self._renderers = {}
+        cls = type(self)
+        if (cls.headings is TableFormatter.headings and
+                cls.format_headings is TableFormatter.format_headings):
+            raise TypeError(f"Can't instantiate {cls.__name__} without headings() "
+                            'or format_headings()')
+
+    def format_headings(self, headers):
         raise NotImplementedError()
 
-    @abstractmethod
+    def format_row(self, rowdata):
+        render = self._renderers.get(len(rowdata))
+        if render is None:
+            formats = self.column_formats or ['%s'] * len(rowdata)
+            render = self._renderers[len(rowdata)] = \
+                self.create_row_renderer(formats, len(rowdata))
+        return render(rowdata)
+
+    def create_row_renderer(self, formats, ncells):
+        '''
+        Create a function that renders a row of ncells values with a
+        single % operation. The column formats, cell padding, separators
+        and prefix/suffix are all combined into one template string.
+        Like zip(), only min(len(formats), ncells) cells are output.
+        '''
+        def literal(text):
+            return text.replace('%', '%%')
+
+        n = min(len(formats), ncells)
+        formats = formats[:n]
+        cells = [merge_format(self.cell, fmt) for fmt in formats]
+        if None in cells:
+            # Some format can't be merged into the cell. Apply the
+            # column formats first, then fill in the template.
+            cells = [self.cell] * n
+            template = (literal(self.prefix) + literal(self.separator).join(cells) +
+                        literal(self.suffix))
+            return lambda rowdata: template % tuple([fmt % d for fmt, d in zip(formats, rowdata)])
+
+        template = literal(self.prefix) + literal(self.separator).join(cells) + literal(self.suffix)
+        if n < ncells:
+            return lambda rowdata: template % tuple(rowdata[:n])
+        return lambda rowdata: template % tuple(rowdata)
+
+    def headings(self, headers):
+        self.write(self.format_headings(headers))
+
     def row(self, rowdata):
-        raise NotImplementedError()
+        self.write(self.format_row(rowdata))
+
+    def rows(self, rows):
+        '''
+        Format many rows, joining each batch of them into one write.
+        Subclasses that override row() get it called for every row.
+        '''
+        if type(self).row is not TableFormatter.row:
+            with self:
+                for rowdata in rows:
+                    self.row(rowdata)
+            return
+        rows = iter(rows)
+        format_row = self.format_row
+        with self:
+            while batch := list(islice(rows, self.batchsize)):
+                self.write(''.join(map(format_row, batch)))
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if not self._batching or self._buffered >= self.bufsize:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            (self.out or sys.stdout).write(''.join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+
+    def __enter__(self):
+        self._batching += 1
+        return self
+
+    def __exit__(self, ty, val, tb):
+        self._batching -= 1
+        if not self._batching:
+            self.flush()
 
 
 class ColumnFormatMixin:
@@ -39,7 +172,7 @@ class NewFormatter(TableFormatter):
         pass
 
 
-def create_formatter(type, column_formats=None, upper_headers=False):
+def create_formatter(type, column_formats=None, upper_headers=False, out=None):
     if type == "text":
         formatter_cls = TextTableFormatter
     elif type == "csv":
@@ -54,53 +187,86 @@ def create_formatter(type, column_formats=None, upper_headers=False):
         formatter_cls = PortfolioFormatter
     else:
         raise RuntimeError('Unknown format %s' % type)
-    if column_formats:
+    compiled = issubclass(formatter_cls, TableFormatter)
+    if column_formats and compiled and formatter_cls.row is TableFormatter.row:
+        # Column formats are compiled into the row renderer, see
+        # TableFormatter.create_row_renderer()
+        class formatter_cls(formatter_cls):
+            pass
+        formatter_cls.column_formats = column_formats
+    elif column_formats:
         class formatter_cls(ColumnFormatMixin, formatter_cls):
             formats = column_formats
     if upper_headers:
         class formatter_cls(UpperHeadersMixin, formatter_cls):
             pass
-    return formatter_cls()
+    return formatter_cls(out) if compiled else formatter_cls()
 
 
 class TextTableFormatter(TableFormatter):
-    def headings(self, headers):
-        print(' '.join('%10s' % h for h in headers))
-        print(('-'*10 + ' ')*len(headers))
+    cell = '%10s'
 
-    def row(self, rowdata):
-        print(' '.join('%10s' % d for d in rowdata))
+    def format_headings(self, headers):
+        return (' '.join('%10s' % h for h in headers) + '\n' +
+                ('-'*10 + ' ')*len(headers) + '\n')
 
 
 class CSVTableFormatter(TableFormatter):
-    def headings(self, headers):
-        print(','.join('%s' % h for h in headers))
+    separator = ','
 
-    def row(self, rowdata):
-        print(','.join('%s' % d for d in rowdata))
+    def format_headings(self, headers):
+        return ','.join('%s' % h for h in headers) + '\n'
 
 
 class HTMLTableFormatter(TableFormatter):
-    def headings(self, headers):
-        print("<tr>", end=" ")
-        print(' '.join('<th>%s</th>' % h for h in headers), end=" </tr>\n")
+    cell = '<td>%s</td>'
+    separator = ','
+    prefix = '<tr> '
+    suffix = ' </tr>\n'
 
-    def row(self, rowdata):
-        print("<tr>", end=" ")
-        print(','.join('<td>%s</td>' % d for d in rowdata), end=" </tr>\n")
+    def format_headings(self, headers):
+        return '<tr> ' + ' '.join('<th>%s</th>' % h for h in headers) + ' </tr>\n'
 
 
 class PortfolioFormatter(UpperHeadersMixin, TextTableFormatter):
     formats = ['%s', '%d', '%0.2f']
 
 
+def extract_rows(records, fields):
+    '''
+    Return an iterator of tuples holding fields from each record.
+    Columnar collections (anything with a column() method) are read a
+    column at a time. Otherwise a single getter is built from the first
+    record: itemgetter for dicts and tuples, attrgetter for instances.
+    '''
+    if hasattr(records, 'column'):
+        return zip(*[records.column(name) for name in fields])
+
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return iter(())
+    if isinstance(first, Mapping):
+        getter = itemgetter(*fields)
+    elif isinstance(first, tuple) and hasattr(first, '_fields'):
+        getter = itemgetter(*[first._fields.index(name) for name in fields])
+    elif isinstance(first, tuple):
+        getter = itemgetter(*fields)
+    else:
+        getter = attrgetter(*fields)
+    rows = map(getter, chain([first], records))
+    if len(fields) == 1:
+        # Single-item getters return the value itself, not a tuple
+        rows = ((value,) for value in rows)
+    return rows
+
+
 def print_table(records, fields, formatter):
     if not isinstance(formatter, TableFormatter):
         raise TypeError()
-    formatter.headings(fields)
-    for r in records:
-        rowdata = [getattr(r, fieldname) for fieldname in fields]
-        formatter.row(rowdata)
+    with formatter:
+        formatter.headings(fields)
+        formatter.rows(extract_rows(records, fields))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,70 @@
+import array
+import os
+import tempfile
+import unittest
+import colfile
+import stock
+from colreader import DataCollection, EncodedColumn
+
+
+class TestColfile(unittest.TestCase):
+    def path(self):
+        fd, path = tempfile.mkstemp(suffix='.colf')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def collection(self):
+        return DataCollection({
+            'route': EncodedColumn(['22', '3', '22', '9']),
+            'rides': array.array('q', [10, 20, 30, 40]),
+            'share': array.array('d', [0.5, 0.25, 0.125, 0.0]),
+            'note': ['a', 'b', 'c', 'd'],
+        })
+
+    def test_collection_round_trip(self):
+        path = self.path()
+        data = self.collection()
+        colfile.write_colfile(path, data)
+        result = colfile.read_colfile(path)
+        self.assertEqual(list(result), list(data))
+        self.assertEqual(colfile.read_colfile_schema(path),
+                         [('route', 'str'), ('rides', 'int'), ('share', 'float'), ('note', 'str')])
+
+    def test_memoryview_columns(self):
+        # Columns read back are memoryviews into the file. Write them out again.
+        first, second = self.path(), self.path()
+        colfile.write_colfile(first, self.collection())
+        data = colfile.read_colfile(first)
+        self.assertIsInstance(data.column('rides'), memoryview)
+        colfile.write_colfile(second, data)
+        self.assertEqual(list(colfile.read_colfile(second)), list(self.collection()))
+
+    def test_copied_columns(self):
+        path = self.path()
+        colfile.write_colfile(path, self.collection())
+        data = colfile.read_colfile(path, copy=True)
+        self.assertIsInstance(data.column('rides'), array.array)
+        record = {'route': '22', 'rides': 50, 'share': 1.0, 'note': 'e'}
+        data.append(record)
+        self.assertEqual(list(data), list(self.collection()) + [record])
+
+    def test_instances_round_trip(self):
+        path = self.path()
+        portfolio = [stock.Stock('GOOG', 100, 490.1), stock.Stock('IBM', 50, 91.1)]
+        colfile.write_colfile(path, portfolio)
+        result = colfile.read_colfile_as_instances(path, stock.Stock)
+        self.assertEqual(list(map(repr, result)), list(map(repr, portfolio)))
+        self.assertEqual(colfile.read_colfile_schema(path),
+                         [('name', 'str'), ('shares', 'int'), ('price', 'float')])
+
+    def test_empty_list(self):
+        path = self.path()
+        with self.assertRaises(ValueError):
+            colfile.write_colfile(path, [])
+        colfile.write_colfile(path, [], stock.Stock)
+        self.assertEqual(colfile.read_colfile_as_instances(path, stock.Stock), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
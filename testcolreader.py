@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+import colreader
+
+
+class TestCSVScanner(unittest.TestCase):
+    def read_columns(self, text, types, reader=colreader.read_csv_as_columns, **kwargs):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', newline='') as file:
+            file.write(text)
+        self.addCleanup(os.remove, path)
+        return reader(path, types, **kwargs)
+
+    def test_ragged_rows(self):
+        # The field count adds up, but rows must not shift into each other
+        with self.assertLogs('colreader', 'WARNING'):
+            data = self.read_columns('a,b,c,d\n1,2,3\n4,5,6,7,8\n9,10,11,12\n', [int] * 4)
+        self.assertEqual(list(data), [{'a': 9, 'b': 10, 'c': 11, 'd': 12}])
+
+    def test_selected_columns(self):
+        text = 'a,b,c\n1,x,2.5\n3,y,4.5\n'
+        data = self.read_columns(text, [int, str, float], columns=['c', 'a'])
+        self.assertEqual(list(data), [{'c': 2.5, 'a': 1}, {'c': 4.5, 'a': 3}])
+        data = self.read_columns(text, [int, str, float], columns=['b'])
+        self.assertEqual(list(data.column('b')), ['x', 'y'])
+
+    def test_selected_columns_ragged_rows(self):
+        with self.assertLogs('colreader', 'WARNING'):
+            data = self.read_columns('a,b,c\n1,2\n3,4,5,6\n7,8,9\n', [int] * 3, columns=['c'])
+        self.assertEqual(list(data.column('c')), [9])
+
+    def test_bad_values_skipped(self):
+        text = 'name,shares,price\nAA,15,39.48\nC,,53.08\nDIS,50,N/A\nGM,15,31.44\n'
+        for reader in (colreader.read_csv_as_columns, colreader.read_csv_as_arrays):
+            with self.assertLogs('colreader', 'WARNING') as logs:
+                data = self.read_columns(text, [str, int, float], reader)
+            self.assertEqual(len(logs.output), 2)
+            self.assertEqual(list(data.column('name')), ['AA', 'GM'])
+            self.assertEqual(list(data.column('shares')), [15, 15])
+
+    def test_quoted_newline(self):
+        data = self.read_columns('a,b\n1,"x\ny"\n2,"z\r\nw"\n', [int, str])
+        self.assertEqual(list(data), [{'a': 1, 'b': 'x\ny'}, {'a': 2, 'b': 'z\r\nw'}])
+
+    def test_quoted_field_across_blocks(self):
+        # A quoted field spanning the block boundary is kept in one block
+        rows = ['%d,"%s\n%s"' % (n, 'x' * 50, 'y' * 50) for n in range(20)]
+        text = 'a,b\n' + '\n'.join(rows) + '\n'
+        old = colreader.CSVScanner.blocksize
+        colreader.CSVScanner.blocksize = 300
+        try:
+            data = self.read_columns(text, [int, str])
+        finally:
+            colreader.CSVScanner.blocksize = old
+        self.assertEqual(list(data.column('a')), list(range(20)))
+        self.assertEqual(set(data.column('b')), {'x' * 50 + '\n' + 'y' * 50})
+
+    def test_unicode_line_separators(self):
+        data = self.read_columns('a,b\n1,"p q"\n2,r\x85s\n', [int, str])
+        self.assertEqual(list(data.column('b')), ['p q', 'r\x85s'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+import colfile
+import orig_stock
+import parsecache
+import reader
+import stock
+import validate
+from structure import Structure
+from validate import String, Bool
+
+
+class Flag(Structure):
+    name = String()
+    flag = Bool()
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        parsecache.enable(self.directory)
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(parsecache.disable)
+
+    def test_cached_instances(self):
+        first = reader.read_csv_as_instances('Data/portfolio.csv', stock.Stock)
+        self.assertEqual(len(parsecache._cache.entries()), 1)
+        second = reader.read_csv_as_instances('Data/portfolio.csv', stock.Stock)
+        self.assertEqual(list(map(repr, first)), list(map(repr, second)))
+
+    def test_validation_mode_in_key(self):
+        path = os.path.join(self.directory, 'bad.csv')
+        with open(path, 'w') as file:
+            file.write('name,shares,price\nAA,100,32.2\nIBM,-50,91.1\n')
+        validate.set_validation('off')
+        try:
+            self.assertEqual(len(reader.read_csv_as_instances(path, stock.Stock)), 2)
+        finally:
+            validate.set_validation('full')
+        with self.assertLogs('reader', 'WARNING'):
+            self.assertEqual(len(reader.read_csv_as_instances(path, stock.Stock)), 1)
+
+    def test_plain_class_not_cached(self):
+        portfolio = reader.read_csv_as_instances('Data/portfolio.csv', orig_stock.Stock)
+        self.assertEqual(len(portfolio), 7)
+        self.assertEqual(parsecache._cache.entries(), [])
+
+    def test_unstorable_fields_not_cached(self):
+        path = os.path.join(self.directory, 'flags.csv')
+        with open(path, 'w') as file:
+            file.write('name,flag\na,1\nb,\n')
+        self.assertFalse(colfile.storable(Flag))
+        self.assertEqual(len(reader.read_csv_as_instances(path, Flag)), 2)
+        self.assertEqual(parsecache._cache.entries(), [])
+
+    def test_store_failure(self):
+        def fail(filename, data):
+            open(filename, 'w').close()
+            raise OSError('disk full')
+        write_colfile = colfile.write_colfile
+        colfile.write_colfile = fail
+        try:
+            with self.assertLogs('parsecache', 'WARNING'):
+                portfolio = reader.read_csv_as_instances('Data/portfolio.csv', stock.Stock)
+        finally:
+            colfile.write_colfile = write_colfile
+        self.assertEqual(len(portfolio), 7)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
 import unittest
 import stock
+import validate
+from structure import Structure
+from validate import String, PositiveInteger, PositiveFloat
 
 
 class TestStock(unittest.TestCase):
@@ -30,6 +33,12 @@ class TestStock(unittest.TestCase):
         self.assertEqual(s.shares, 100)
         self.assertEqual(s.price, 490.1)
 
+    def test_from_row_trusted(self):
+        s = stock.Stock.from_row_trusted(['GOOG', '100', '490.1'])
+        self.assertEqual(s.name, 'GOOG')
+        self.assertEqual(s.shares, 100)
+        self.assertEqual(s.price, 490.1)
+
     def test_repr(self):
         s = stock.Stock(name='GOOG', shares=100, price=490.1)
         self.assertEqual(repr(s), "Stock('GOOG', 100, 490.1)")
@@ -39,6 +48,11 @@ class TestStock(unittest.TestCase):
         t = stock.Stock(name='GOOG', shares=100, price=490.1)
         self.assertTrue(s == t)
 
+    def test_private_attribute(self):
+        s = stock.Stock('GOOG', 100, 490.1)
+        s._extra = 1
+        self.assertEqual(s._extra, 1)
+
     # Tests for failure conditions
     def test_shares_badtype(self):
         s = stock.Stock('GOOG', 100, 490.1)
@@ -65,6 +79,82 @@ class TestStock(unittest.TestCase):
         with self.assertRaises(AttributeError):
             s.share = 100
 
+    def test_validation_off(self):
+        validate.set_validation('off')
+        try:
+            s = stock.Stock('GOOG', 100, 490.1)
+            s.shares = -50
+            self.assertEqual(s.shares, -50)
+        finally:
+            validate.set_validation('full')
+
+    def test_validation_sampled(self):
+        # Every field of a sampled row is checked, so each bad field is
+        # caught in 1 of every 3 rows
+        validate.set_validation('sampled', 3)
+        try:
+            for bad in [(0, -1, 1.0), (0, 1, -1.0), ('G', -1, 1.0), ('G', 1, -1.0)]:
+                failed = 0
+                for n in range(30):
+                    try:
+                        stock.Stock(*bad)
+                    except (TypeError, ValueError):
+                        failed += 1
+                self.assertEqual(failed, 10)
+        finally:
+            validate.set_validation('full')
+
+    def test_validation_sampled_functions(self):
+        validate.set_validation('sampled', 2)
+        try:
+            s = stock.Stock('GOOG', 100, 490.1)
+            failed = 0
+            for n in range(10):
+                try:
+                    s.sell(-1)
+                except TypeError:
+                    failed += 1
+            self.assertEqual(failed, 5)
+        finally:
+            validate.set_validation('full')
+
+
+class SlotStock(Structure, slots=True):
+    name = String()
+    shares = PositiveInteger()
+    price = PositiveFloat()
+    _shares = 'class attribute'
+
+
+class TestSlotStock(unittest.TestCase):
+    def test_slots(self):
+        s = SlotStock('GOOG', 100, 490.1)
+        self.assertFalse(hasattr(s, '__dict__'))
+        self.assertEqual((s.name, s.shares, s.price), ('GOOG', 100, 490.1))
+
+    def test_private_names_free(self):
+        # Storage slots don't take over the _<field> names
+        s = SlotStock('GOOG', 100, 490.1)
+        self.assertEqual(s._shares, 'class attribute')
+        with self.assertRaises(AttributeError):
+            s._shares = -5
+        self.assertEqual(s.shares, 100)
+
+    def test_validation(self):
+        s = SlotStock('GOOG', 100, 490.1)
+        with self.assertRaises(ValueError):
+            s.shares = -5
+        with self.assertRaises(TypeError):
+            SlotStock('GOOG', '100', 490.1)
+        with self.assertRaises(AttributeError):
+            s.share = 100
+
+    def test_from_row(self):
+        s = SlotStock.from_row(['GOOG', '100', '490.1'])
+        self.assertEqual((s.name, s.shares, s.price), ('GOOG', 100, 490.1))
+        t = SlotStock.from_row_trusted(['GOOG', '100', '490.1'])
+        self.assertEqual(repr(s), repr(t))
+
 
 if __name__ == '__main__':
     unittest.main()
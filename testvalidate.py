@@ -0,0 +1,55 @@
+import gc
+import unittest
+import validate
+from validate import Validator, Positive, NonEmpty, PositiveInteger, validated
+
+
+class TestCheckMany(unittest.TestCase):
+    def test_valid(self):
+        self.assertEqual(PositiveInteger.check_many([1, 2, 3]), [1, 2, 3])
+
+    def test_reports_indices(self):
+        with self.assertRaises(ValueError) as cm:
+            PositiveInteger.check_many([1, -1, 2, -2])
+        self.assertIn('[1]', str(cm.exception))
+        self.assertIn('[3]', str(cm.exception))
+
+    def test_condition_raises(self):
+        # The flattened condition can't be evaluated on these values
+        with self.assertRaises(TypeError) as cm:
+            Positive.check_many([1, 'x'])
+        self.assertIn('[1]', str(cm.exception))
+        with self.assertRaises(TypeError) as cm:
+            NonEmpty.check_many([3])
+        self.assertIn('[0]', str(cm.exception))
+
+    def test_iterable(self):
+        self.assertEqual(PositiveInteger.check_many(x for x in [1, 2]), [1, 2])
+        with self.assertRaises(ValueError) as cm:
+            PositiveInteger.check_many(x for x in [1, -1])
+        self.assertIn('[1]', str(cm.exception))
+
+    def test_condition_disagrees_with_check(self):
+        class Odd(Validator):
+            condition = 'v % 2'
+
+        with self.assertRaises(ValueError) as cm:
+            Odd.check_many([1, 2])
+        self.assertIn('[1]', str(cm.exception))
+
+
+
+class TestPolicy(unittest.TestCase):
+    def test_sites_released(self):
+        count = len(validate.policy.sites)
+        for _ in range(100):
+            @validated
+            def func(x: PositiveInteger):
+                return x
+        del func
+        gc.collect()
+        self.assertEqual(len(validate.policy.sites), count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,83 @@
 # validator.py
 import inspect
+from collections.abc import Sequence
 from functools import wraps
+from itertools import cycle, repeat
 import decimal
+import weakref
+
+
+class ValidationPolicy:
+    '''
+    Process-wide switch for how much validation is done.
+
+    full    - every value is checked (the default)
+    sampled - one in every N checks is performed
+    off     - nothing is checked and values are stored directly
+
+    Each place that checks (a descriptor, a generated __init__, a
+    validated function) gets its own site from site(). On the hot path
+    it calls site.sample() to decide whether to check. A call that
+    checks several values decides once, so a sampled row or call has
+    every value checked, and separate sites don't share one count.
+    Sites are held weakly, so ones made for classes and functions that
+    have gone away aren't kept alive.
+    '''
+    modes = ('full', 'sampled', 'off')
+
+    def __init__(self):
+        self.sites = weakref.WeakSet()
+        self.set('full')
+
+    def set(self, mode, every=1):
+        if mode not in self.modes:
+            raise ValueError(f'Unknown validation mode {mode!r}')
+        if mode == 'sampled' and every < 1:
+            raise ValueError('every must be >= 1')
+        self.mode = mode
+        self.every = every if mode == 'sampled' else 1
+        self.enabled = mode != 'off'
+        for site in self.sites:
+            site.sample = self._sampler()
+
+    def _sampler(self):
+        if self.mode == 'full':
+            return repeat(True).__next__
+        elif self.mode == 'off':
+            return repeat(False).__next__
+        else:
+            return cycle([True] + [False] * (self.every - 1)).__next__
+
+    def site(self):
+        '''
+        Return a new sampling site. Its sample() follows the current mode.
+        '''
+        site = _Site()
+        site.sample = self._sampler()
+        self.sites.add(site)
+        return site
+
+
+class _Site:
+    __slots__ = ('sample', '__weakref__')
+
+
+policy = ValidationPolicy()
+
+
+def set_validation(mode, every=1):
+    '''
+    Set the validation mode: 'full', 'sampled' (check 1 in every calls)
+    or 'off'. Takes effect immediately.
+    '''
+    policy.set(mode, every)
+
+
+def get_validation():
+    '''
+    Return the current validation (mode, every)
+    '''
+    return policy.mode, policy.every
 
 
 class ValidatedFunction:
@@ -25,9 +101,66 @@ def isvalidator(item):
     return isinstance(item, type) and issubclass(item, Validator)
 
 
-def validated(func):
+class _Placeholder:
+    # Stands in for a default value when writing out a signature
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+def create_checked(func, annotations, retcheck):
+    '''
+    Create a wrapper around func that checks the arguments named in
+    annotations (and the result, if retcheck is given). The wrapper is
+    generated with func's own parameter list, so arguments are matched
+    up by the call itself instead of by Signature.bind().
+    '''
     sig = inspect.signature(func)
+    locs = {'_func': func, '_retcheck': retcheck, '_site': policy.site()}
+    params = []
+    call = []
+    for n, param in enumerate(sig.parameters.values()):
+        if param.default is not param.empty:
+            locs[f'_default{n}'] = param.default
+            param = param.replace(default=_Placeholder(f'_default{n}'))
+        params.append(param.replace(annotation=param.empty))
+        if param.kind == param.VAR_POSITIONAL:
+            call.append(f'*{param.name}')
+        elif param.kind == param.VAR_KEYWORD:
+            call.append(f'**{param.name}')
+        elif param.kind == param.KEYWORD_ONLY:
+            call.append(f'{param.name}={param.name}')
+        else:
+            call.append(param.name)
+    sig = sig.replace(parameters=params, return_annotation=sig.empty)
+
+    code = f'def wrapper{sig}:\n'
+    code += '    if not _site.sample():\n'
+    code += f'        return _func({", ".join(call)})\n'
+    if annotations:
+        code += '    _errors = []\n'
+        for n, name in enumerate(annotations):
+            locs[f'_check{n}'] = annotations[name].check
+            code += '    try:\n'
+            code += f'        _check{n}({name})\n'
+            code += '    except Exception as _e:\n'
+            code += f"        _errors.append(f'  {name}: {{_e}}')\n"
+        code += '    if _errors:\n'
+        code += "        raise TypeError('Bad Arguments\\n' + '\\n'.join(_errors))\n"
+    code += f'    _result = _func({", ".join(call)})\n'
+    if retcheck:
+        code += '    try:\n'
+        code += '        _retcheck.check(_result)\n'
+        code += '    except Exception as _e:\n'
+        code += "        raise TypeError(f'Bad return: {_e}') from None\n"
+    code += '    return _result\n'
+    exec(code, locs)
+    return wraps(func)(locs['wrapper'])
+
 
+def validated(func):
     # Gather the function annotations
     annotations = {name: val for name, val in func.__annotations__.items()
                    if isvalidator(val)}
@@ -35,73 +168,28 @@ def validated(func):
     # Get the return annotation (if any)
     retcheck = annotations.pop('return', None)
 
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        bound = sig.bind(*args, **kwargs)
-        errors = []
-
-        # Enforce argument checks
-        for name, validator in annotations.items():
-            try:
-                validator.check(bound.arguments[name])
-            except Exception as e:
-                errors.append(f'  {name}: {e}')
-
-        if errors:
-            raise TypeError('Bad Arguments\n' + '\n'.join(errors))
-
-        result = func(*args, **kwargs)
-
-        # Enforce return check (if any)
-        if retcheck:
-            try:
-                retcheck.check(result)
-            except Exception as e:
-                raise TypeError(f'Bad return: {e}') from None
-        return result
-
-    return wrapper
+    return create_checked(func, annotations, retcheck)
 
 
 def enforce(**annotations):
     retcheck = annotations.pop("return_", None)
 
     def decorate(func):
-        sig = inspect.signature(func)
-
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            bound = sig.bind(*args, **kwargs)
-            errors = []
-
-            # Enforce argument checks
-            for name, validator in annotations.items():
-                try:
-                    validator.check(bound.arguments[name])
-                except Exception as e:
-                    errors.append(f'  {name}: {e}')
-
-            if errors:
-                raise TypeError('Bad Arguments\n' + '\n'.join(errors))
-
-            result = func(*args, **kwargs)
-
-            # Enforce return check (if any)
-            if retcheck:
-                try:
-                    retcheck.check(result)
-                except Exception as e:
-                    raise TypeError(f'Bad return: {e}') from None
-            return result
-        return wrapper
+        return create_checked(func, annotations, retcheck)
     return decorate
 
 
 class Validator:
     validators = {}
 
+    # Expression in terms of v that is true for a valid value. The
+    # conditions along the MRO are joined into one predicate for
+    # check_many(), in the same order check() applies them via super().
+    condition = None
+
     def __init__(self, name=None):
         self.name = name
+        self._site = policy.site()
 
     def __set_name__(self, cls, name):
         self.name = name
@@ -111,15 +199,103 @@ class Validator:
         return value
 
     def __set__(self, instance,	value):
-        instance.__dict__[self.name] = self.check(value)
+        if self._site.sample():
+            value = self.check(value)
+        instance.__dict__[self.name] = value
+
+    def slot_property(self, slot):
+        '''
+        Return a property that validates like this descriptor but stores
+        values in slot, a __slots__ member descriptor
+        '''
+        check = self.check
+        store = slot.__set__
+        site = self._site
+
+        def setter(instance, value):
+            if site.sample():
+                value = check(value)
+            store(instance, value)
+        return property(slot.__get__, setter)
+
+    @classmethod
+    def check_many(cls, values):
+        '''
+        Validate a whole sequence of values in one pass. Raises an
+        exception listing every failing index. Other iterables are
+        turned into a list first, which is returned.
+        '''
+        if not isinstance(values, Sequence):
+            values = list(values)
+        try:
+            failed = cls._find_failures(values)
+        except Exception:
+            # A value the flattened condition can't even be evaluated on
+            # (e.g. 'x' >= 0). Let check() sort them out one at a time.
+            failed = cls._check_each(values)
+        if failed:
+            errors = []
+            for n in failed:
+                try:
+                    cls.check(values[n])
+                except Exception as e:
+                    errors.append((n, e))
+            if not errors:
+                raise ValueError(f'{cls.__name__}: values at {failed} fail the condition '
+                                 f'{cls.condition!r} but pass check()')
+            raise type(errors[0][1])('Bad values\n' +
+                                     '\n'.join(f'  [{n}]: {e}' for n, e in errors))
+        return values
+
+    @staticmethod
+    def _find_failures(values):
+        return []
+
+    @classmethod
+    def _check_each(cls, values):
+        failed = []
+        for n, v in enumerate(values):
+            try:
+                cls.check(v)
+            except Exception:
+                failed.append(n)
+        return failed
+
+    @classmethod
+    def create_find_failures(cls):
+        '''
+        Create _find_failures() with the conditions of every class in
+        the MRO flattened into a single expression
+        '''
+        conditions = []
+        for base in cls.__mro__:
+            if 'condition' in vars(base):
+                if base.condition:
+                    conditions.append(f'({base.condition})')
+            elif 'check' in vars(base) and base is not Validator:
+                # A custom check() we can't flatten. Call it per value.
+                conditions = None
+                break
+
+        if conditions is None:
+            cls._find_failures = cls._check_each
+            return
+        test = ' and '.join(conditions) or 'True'
+        code = 'def _find_failures(values):\n'
+        code += f'    return [n for n, v in enumerate(values) if not ({test})]\n'
+        locs = {'expected_type': getattr(cls, 'expected_type', object)}
+        exec(code, locs)
+        cls._find_failures = staticmethod(locs['_find_failures'])
 
     @classmethod
     def __init_subclass__(cls):
         cls.validators[cls.__name__] = cls
+        cls.create_find_failures()
 
 
 class Typed(Validator):
     expected_type = object
+    condition = 'isinstance(v, expected_type)'
 
     @classmethod
     def check(cls, value):
@@ -131,6 +307,7 @@ class Typed(Validator):
 
 class Positive(Validator):
     expected_types = [float, int]
+    condition = 'v >= 0'
 
     @classmethod
     def check(cls, value):
@@ -140,6 +317,8 @@ class Positive(Validator):
 
 
 class NonEmpty(Validator):
+    condition = 'len(v) != 0'
+
     @classmethod
     def check(cls, value):
         if len(value) == 0: